@@ -1,3 +1,145 @@
+import hashlib
+import uuid
 from collections import namedtuple
+from typing import Any
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import boto3
+from botocore.awsrequest import AWSResponse
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
 SchemaFixture = namedtuple("SchemaFixture", ["schema", "config_filename", "expected_labels", "converted_weights_name"])
+
+
+class FakeS3Body:
+    """
+    Тело ответа get_object, отдающее данные блоками.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def iter_chunks(self, chunk_size: int):
+        for start in range(0, len(self.data), chunk_size):
+            yield self.data[start : start + chunk_size]
+
+
+class FakeS3Client:
+    """
+    S3 клиент в памяти: хранит объекты и считает ETag так же, как S3 (md5 или md5 от md5 частей).
+    """
+
+    def __init__(self):
+        self.objects: dict[tuple[str, str], dict[str, Any]] = {}
+        self.get_requests: list[tuple[str, str | None]] = []
+        self.uploads: dict[str, dict[int, bytes]] = {}
+
+    def put(self, bucket: str, key: str, data: bytes, part_size: int | None = None, **extra: Any) -> str:
+        if part_size:
+            digests = [hashlib.md5(data[i : i + part_size]).digest() for i in range(0, len(data), part_size)]
+            etag = f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+        else:
+            etag = hashlib.md5(data).hexdigest()
+        self.objects[(bucket, key)] = {"data": data, "etag": etag, "part_size": part_size, **extra}
+        return etag
+
+    def _get(self, bucket: str, key: str) -> dict[str, Any]:
+        if (bucket, key) not in self.objects:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        return self.objects[(bucket, key)]
+
+    def head_object(self, Bucket: str, Key: str, PartNumber: int | None = None) -> dict[str, Any]:
+        obj = self._get(Bucket, Key)
+        length = len(obj["data"])
+        if PartNumber is not None and obj["part_size"]:
+            length = min(obj["part_size"], length)
+        head = {"ETag": f'"{obj["etag"]}"', "ContentLength": length}
+        if "ContentEncoding" in obj:
+            head["ContentEncoding"] = obj["ContentEncoding"]
+        return head
+
+    def get_object(self, Bucket: str, Key: str, Range: str | None = None) -> dict[str, Any]:
+        self.get_requests.append((Key, Range))
+        data = self._get(Bucket, Key)["data"]
+        if Range:
+            start, end = Range.removeprefix("bytes=").split("-")
+            data = data[int(start) : int(end) + 1]
+        return {"Body": FakeS3Body(data)}
+
+    def delete_object(self, Bucket: str, Key: str) -> dict[str, Any]:
+        self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str, **_: Any) -> dict[str, Any]:
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        return {"Contents": [{"Key": key} for key in keys], "IsTruncated": False}
+
+
+class FakeS3RawBody:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def stream(self, **_: Any):
+        yield self.data
+
+
+def boto3_client_over(storage: FakeS3Client) -> Any:
+    """
+    Настоящий boto3 клиент, HTTP запросы которого обслуживаются из FakeS3Client,
+    чтобы проверять загрузку через s3transfer без сети.
+    """
+    client = boto3.client(
+        "s3",
+        endpoint_url="http://s3.test",
+        region_name="us-east-1",
+        aws_access_key_id="test",
+        aws_secret_access_key="test",
+        config=Config(s3={"addressing_style": "path"}),
+    )
+
+    def respond(request: Any, status: int, headers: dict[str, str] | None = None, body: bytes = b"") -> AWSResponse:
+        return AWSResponse(request.url, status, headers or {}, FakeS3RawBody(body))
+
+    def serve(request: Any, **_: Any) -> AWSResponse:
+        url = urlsplit(request.url)
+        bucket, _, key = unquote(url.path).lstrip("/").partition("/")
+        query = parse_qs(url.query, keep_blank_values=True)
+        body = request.body.read() if hasattr(request.body, "read") else request.body or b""
+        body = body.encode() if isinstance(body, str) else body
+
+        if request.method == "PUT" and "partNumber" in query:
+            storage.uploads[query["uploadId"][0]][int(query["partNumber"][0])] = body
+            return respond(request, 200, {"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+        if request.method == "PUT":
+            return respond(request, 200, {"ETag": f'"{storage.put(bucket, key, body)}"'})
+        if request.method == "POST" and "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            storage.uploads[upload_id] = {}
+            return respond(
+                request,
+                200,
+                body=f"<InitiateMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{key}</Key>"
+                f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>".encode(),
+            )
+        if request.method == "POST" and "uploadId" in query:
+            parts = storage.uploads.pop(query["uploadId"][0])
+            etag = storage.put(bucket, key, b"".join(parts[number] for number in sorted(parts)), len(parts[1]))
+            return respond(
+                request,
+                200,
+                body=f"<CompleteMultipartUploadResult><ETag>{etag}</ETag></CompleteMultipartUploadResult>".encode(),
+            )
+        if request.method == "HEAD":
+            try:
+                head = storage.head_object(bucket, key)
+            except ClientError:
+                return respond(request, 404)
+            return respond(request, 200, {"ETag": head["ETag"], "Content-Length": str(head["ContentLength"])})
+        if request.method == "DELETE":
+            storage.delete_object(bucket, key)
+            return respond(request, 204)
+        raise NotImplementedError(f"{request.method} {request.url}")
+
+    client.meta.events.register("before-send.s3", serve)
+    return client
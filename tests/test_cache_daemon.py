@@ -0,0 +1,185 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+from vlmsw import pull_converted_weights as pull_converted_weights_module
+from vlmsw.cache_daemon import CacheDaemon
+from vlmsw.pull_converted_weights import download_weights_file
+from vlmsw.settings.settings import settings
+
+from . import FakeS3Client
+
+KEY = "yolov5/1/yolov5.engine"
+
+
+@pytest.fixture
+def s3_client(monkeypatch) -> FakeS3Client:
+    """
+    S3 в памяти с одним файлом сконвертированных весов.
+    """
+    client = FakeS3Client()
+    client.put(settings.artifacts_converted_bucket, KEY, os.urandom(3 * 1024 * 1024 + 17))
+    monkeypatch.setattr(pull_converted_weights_module, "get_s3_client", lambda: client)
+    return client
+
+
+@pytest.fixture
+def tmpdir_path() -> Iterator[Path]:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield Path(tmpdir)
+
+
+@pytest.fixture
+def daemon(monkeypatch, tmpdir_path, s3_client) -> Iterator[CacheDaemon]:
+    """
+    Кеширующий демон, запущенный в отдельном потоке.
+    """
+    cache_daemon = CacheDaemon(tmpdir_path / "daemon.sock", tmpdir_path / "store")
+    monkeypatch.setattr(settings, "CACHE_DAEMON_SOCKET", str(cache_daemon.socket_path))
+    thread = threading.Thread(target=cache_daemon.serve_forever, daemon=True)
+    thread.start()
+    yield cache_daemon
+    cache_daemon.shutdown()
+    cache_daemon.server_close()
+    thread.join()
+
+
+def pull(save_to: Path) -> Path:
+    return download_weights_file("yolov5.engine", "yolov5", "1", settings.artifacts_converted_bucket, save_to)
+
+
+def test__cache_daemon__serves_once_per_host(daemon, s3_client, tmpdir_path) -> None:
+    """
+    Тест проверяет, что демон скачивает файл один раз и отдает его всем клиентам хоста.
+    """
+    first = pull(tmpdir_path / "first")
+    second = pull(tmpdir_path / "second")
+
+    data = s3_client.objects[(settings.artifacts_converted_bucket, KEY)]["data"]
+    assert first.read_bytes() == data
+    assert second.read_bytes() == data
+    assert len(s3_client.get_requests) == 1
+    assert os.stat(daemon.socket_path).st_mode & 0o777 == 0o660
+
+
+def test__cache_daemon__copy_from_descriptor(daemon, s3_client, tmpdir_path, monkeypatch) -> None:
+    """
+    Тест проверяет копирование из переданного дескриптора, если жесткую ссылку создать нельзя.
+    """
+
+    def cross_device_link(*_) -> None:
+        raise OSError("Invalid cross-device link")
+
+    monkeypatch.setattr(pull_converted_weights_module.os, "link", cross_device_link)
+    path = pull(tmpdir_path / "client")
+
+    assert path.read_bytes() == s3_client.objects[(settings.artifacts_converted_bucket, KEY)]["data"]
+    assert not path.with_name(f"{path.name}.part").exists()
+
+
+def test__cache_daemon__rejects_other_buckets(daemon) -> None:
+    """
+    Тест проверяет, что демон отдает только бакет сконвертированных весов.
+    """
+    with pytest.raises(ValueError, match="not served"):
+        daemon.fetch("yolov5.engine", "yolov5", "1", settings.mlflow_default_bucket)
+    with pytest.raises(ValueError, match="Invalid weights location"):
+        daemon.fetch("yolov5.engine", "..", "1", settings.artifacts_converted_bucket)
+
+
+def test__cache_daemon__error_reply_falls_back(daemon, s3_client, tmpdir_path, monkeypatch) -> None:
+    """
+    Тест проверяет, что при ошибке демона клиент скачивает файл напрямую.
+    """
+
+    def broken_fetch(*_, **__) -> Path:
+        raise RuntimeError("store is broken")
+
+    monkeypatch.setattr(daemon, "fetch", broken_fetch)
+    path = pull(tmpdir_path / "client")
+
+    assert path.read_bytes() == s3_client.objects[(settings.artifacts_converted_bucket, KEY)]["data"]
+
+
+@contextmanager
+def answer_once(socket_path: Path, reply: bytes, fd_path: Path) -> Iterator[None]:
+    """
+    Поддельный демон: на один запрос отвечает заданным сообщением и дескриптором файла fd_path.
+    """
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(socket_path))
+    server.listen(1)
+
+    def answer() -> None:
+        connection, _ = server.accept()
+        with connection:
+            connection.recv(4096)
+            if not reply:
+                return
+            fd = os.open(fd_path, os.O_RDONLY)
+            try:
+                socket.send_fds(connection, [reply], [fd])
+            finally:
+                os.close(fd)
+
+    thread = threading.Thread(target=answer, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        thread.join()
+        server.close()
+
+
+@pytest.mark.parametrize("reply", [b"", b"not json\n", b'{"size": 1}\n'])
+def test__cache_daemon__broken_reply_falls_back(s3_client, tmpdir_path, monkeypatch, reply: bytes) -> None:
+    """
+    Тест проверяет, что пустой или некорректный ответ демона не мешает скачать файл напрямую.
+    """
+    socket_path = tmpdir_path / "broken.sock"
+    monkeypatch.setattr(settings, "CACHE_DAEMON_SOCKET", str(socket_path))
+    with answer_once(socket_path, reply, tmpdir_path):
+        path = pull(tmpdir_path / "client")
+
+    assert path.read_bytes() == s3_client.objects[(settings.artifacts_converted_bucket, KEY)]["data"]
+    assert len(s3_client.get_requests) == 1
+
+
+def test__cache_daemon__path_of_another_file(s3_client, tmpdir_path, monkeypatch) -> None:
+    """
+    Тест проверяет, что файл, на который указывает путь из ответа демона, не используется,
+    если это не тот файл, что передан дескриптором: содержимое копируется из дескриптора.
+    """
+    served = tmpdir_path / "store" / "served.engine"
+    served.parent.mkdir()
+    served.write_bytes(b"weights from the descriptor")
+    stale = tmpdir_path / "store" / "stale.engine"
+    stale.write_bytes(b"stale weights at the path")
+    reply = json.dumps({"path": str(stale), "size": served.stat().st_size, "sha256": None, "etag": None})
+
+    socket_path = tmpdir_path / "daemon.sock"
+    monkeypatch.setattr(settings, "CACHE_DAEMON_SOCKET", str(socket_path))
+    with answer_once(socket_path, reply.encode() + b"\n", served):
+        path = pull(tmpdir_path / "client")
+
+    assert path.read_bytes() == b"weights from the descriptor"
+    assert os.stat(path).st_ino not in (served.stat().st_ino, stale.stat().st_ino)
+    assert s3_client.get_requests == []
+
+
+def test__cache_daemon__not_running(s3_client, tmpdir_path, monkeypatch) -> None:
+    """
+    Тест проверяет, что без сокета демона файл скачивается напрямую.
+    """
+    monkeypatch.setattr(settings, "CACHE_DAEMON_SOCKET", str(tmpdir_path / "missing.sock"))
+    path = pull(tmpdir_path / "client")
+
+    assert path.read_bytes() == s3_client.objects[(settings.artifacts_converted_bucket, KEY)]["data"]
+    assert len(s3_client.get_requests) == 1
@@ -0,0 +1,173 @@
+import asyncio
+import base64
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+import httpx
+import pytest
+import zstandard
+
+from vlmsw import pull_converted_weights
+from vlmsw.compression import StreamDecompressor, byte_entropy, is_compressible
+from vlmsw.exceptions import IntegrityException
+from vlmsw.integrity import Manifest
+from vlmsw.pull import download_file
+from vlmsw.settings.settings import settings
+
+from . import FakeS3Client
+
+PART_SIZE = 8 * 1024
+# сжимаемые данные: повторяющийся текст с небольшим шумом
+DATA = b"".join(b"layer.%d.weight " % (i % 97) + os.urandom(2) for i in range(40_000))
+
+
+def compress_frames(data: bytes, frames: int = 1) -> bytes:
+    """
+    Сжимает данные в несколько последовательных кадров zstd.
+    """
+    step = -(-len(data) // frames)
+    compressor = zstandard.ZstdCompressor()
+    return b"".join(compressor.compress(data[start : start + step]) for start in range(0, len(data), step))
+
+
+def test__is_compressible__entropy_check() -> None:
+    """
+    Тест проверяет, что сжимаются только достаточно большие файлы с низкой энтропией.
+    """
+    assert byte_entropy(b"") == 0.0
+    assert byte_entropy(bytes(range(256)) * 4) == pytest.approx(8.0)
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        text = Path(tmpdirname, "text.bin")
+        text.write_bytes(DATA)
+        random = Path(tmpdirname, "random.bin")
+        random.write_bytes(os.urandom(len(DATA)))
+        small = Path(tmpdirname, "small.bin")
+        small.write_bytes(DATA[: settings.COMPRESSION_MIN_SIZE - 1])
+
+        assert is_compressible(text)
+        assert not is_compressible(random)
+        assert not is_compressible(small)
+
+
+@pytest.mark.parametrize("frames", [1, 3])
+def test__stream_decompressor__frames_across_chunks(frames: int) -> None:
+    """
+    Тест проверяет разжатие потока из нескольких кадров, поданного блоками произвольного размера.
+    """
+    compressed = compress_frames(DATA, frames)
+    decompressor = StreamDecompressor()
+    decompressed = b"".join(decompressor.decompress(compressed[i : i + 1000]) for i in range(0, len(compressed), 1000))
+    decompressor.finish("weights")
+
+    assert decompressed == DATA
+
+
+def test__stream_decompressor__truncated() -> None:
+    """
+    Тест проверяет, что оборванный на середине кадра поток вызывает IntegrityException.
+    """
+    compressed = compress_frames(DATA, 2)
+    decompressor = StreamDecompressor()
+    decompressor.decompress(compressed[:-10])
+
+    with pytest.raises(IntegrityException):
+        decompressor.finish("weights")
+
+
+@pytest.mark.parametrize("part_size", [None, PART_SIZE])
+def test__download_weights_file__compressed_object(monkeypatch, part_size: int | None) -> None:
+    """
+    Тест проверяет, что сжатый объект под ключом .zst скачивается одним запросом и разжимается на лету.
+    """
+    s3_client = FakeS3Client()
+    s3_client.put("bucket", "model/1/model.engine.zst", compress_frames(DATA, 2), part_size=part_size)
+    monkeypatch.setattr(pull_converted_weights, "get_s3_client", lambda: s3_client)
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        save_to = Path(tmpdirname)
+        path = pull_converted_weights.download_weights_file("model.engine", "model", "1", "bucket", save_to)
+
+        assert path.read_bytes() == DATA
+        assert s3_client.get_requests == [("model/1/model.engine.zst", None)]
+        assert sorted(child.name for child in save_to.iterdir()) == [
+            ".vlmsw-manifest.json",
+            ".vlmsw-manifest.json.lock",
+            "model.engine",
+        ]
+
+
+def test__download_weights_file__truncated_compressed_object(monkeypatch) -> None:
+    """
+    Тест проверяет, что оборванный сжатый объект не попадает в директорию назначения.
+    """
+    s3_client = FakeS3Client()
+    compressed = compress_frames(DATA)
+    s3_client.put("bucket", "model/1/model.engine.zst", compressed)
+    s3_client.objects[("bucket", "model/1/model.engine.zst")]["data"] = compressed[:-10]
+    monkeypatch.setattr(pull_converted_weights, "get_s3_client", lambda: s3_client)
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        with pytest.raises(IntegrityException):
+            pull_converted_weights.download_weights_file("model.engine", "model", "1", "bucket", Path(tmpdirname))
+        assert not any(path.name.startswith("model.engine") for path in Path(tmpdirname).iterdir())
+
+
+@pytest.mark.parametrize("cut", [0, 10])
+def test__download_file__zstd_encoding(cut: int) -> None:
+    """
+    Тест проверяет разжатие ответа сервиса с Content-Encoding zstd из нескольких кадров
+    и ошибку при оборванном ответе.
+    """
+    compressed = compress_frames(DATA, 3)
+    body = compressed[: len(compressed) - cut]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert "zstd" in request.headers["accept-encoding"]
+        return httpx.Response(200, headers={"content-encoding": "zstd"}, stream=httpx.ByteStream(body))
+
+    async def run(destination: Path) -> Path:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await download_file(client, "http://service/weights", destination)
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        destination = Path(tmpdirname, "model.onnx")
+        if cut:
+            with pytest.raises(IntegrityException):
+                asyncio.run(run(destination))
+            assert not destination.exists()
+        else:
+            assert asyncio.run(run(destination)).read_bytes() == DATA
+
+
+@pytest.mark.parametrize("valid", [True, False])
+def test__download_file__zstd_encoding_digests(valid: bool) -> None:
+    """
+    Тест проверяет, что Repr-Digest сверяется со сжатыми байтами ответа, а X-Checksum-Sha256 - с разжатым файлом.
+    """
+    body = compress_frames(DATA, 2)
+    repr_digest = base64.b64encode(hashlib.sha256(body if valid else DATA).digest()).decode()
+    headers = {
+        "content-encoding": "zstd",
+        "repr-digest": f"sha-256=:{repr_digest}:",
+        "x-checksum-sha256": hashlib.sha256(DATA).hexdigest(),
+    }
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers=headers, stream=httpx.ByteStream(body))
+
+    async def run(destination: Path) -> Path:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await download_file(client, "http://service/weights", destination)
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        destination = Path(tmpdirname, "model.onnx")
+        if valid:
+            assert asyncio.run(run(destination)).read_bytes() == DATA
+            assert Manifest(destination.parent).is_valid(destination, sha256=hashlib.sha256(DATA).hexdigest())
+        else:
+            with pytest.raises(IntegrityException):
+                asyncio.run(run(destination))
+            assert not destination.exists()
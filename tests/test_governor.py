@@ -0,0 +1,141 @@
+import asyncio
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from vlmsw import governor as governor_module
+from vlmsw.governor import Priority, TransferGovernor
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list[float]:
+    """
+    Подменяет time.sleep и time.monotonic: время идет только за счет "сна".
+    """
+    now = [1000.0]
+    delays: list[float] = []
+
+    def fake_sleep(delay: float) -> None:
+        delays.append(delay)
+        now[0] += delay
+
+    monkeypatch.setattr(governor_module.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(governor_module.time, "sleep", fake_sleep)
+    return delays
+
+
+def test__throttle__token_bucket_rate(sleeps) -> None:
+    """
+    Тест проверяет, что после секундного запаса передача ограничивается заданной скоростью.
+    """
+    governor = TransferGovernor(bytes_per_second=10 * MB)
+    for _ in range(30):
+        governor.throttle(MB)
+
+    assert sum(sleeps) == pytest.approx(2.0)
+
+
+def test__throttle__background_share(sleeps) -> None:
+    """
+    Тест проверяет, что фоновые передачи получают только свою долю полосы.
+    """
+    governor = TransferGovernor(bytes_per_second=10 * MB, background_share=0.5)
+    for _ in range(15):
+        governor.throttle(MB, Priority.BACKGROUND)
+
+    assert sum(sleeps) == pytest.approx(2.0)
+
+
+def test__configure__omitted_arguments_are_kept() -> None:
+    """
+    Тест проверяет, что configure() меняет только переданные ограничения.
+    """
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        governor = TransferGovernor(bytes_per_second=MB, max_transfers=2, background_share=0.3, shared_dir=tmpdirname)
+        governor.configure(bytes_per_second=2 * MB)
+
+        assert governor.bytes_per_second == 2 * MB
+        assert governor.max_transfers == 2
+        assert governor.background_share == 0.3
+        assert governor.shared_dir == Path(tmpdirname)
+
+        governor.configure(max_transfers=None)
+        assert governor.max_transfers is None
+        assert governor.bytes_per_second == 2 * MB
+
+
+def test__shared_dir__buckets_are_shared(sleeps) -> None:
+    """
+    Тест проверяет, что при общей директории два процесса (два губернатора) делят одну полосу,
+    включая долю фоновых передач.
+    """
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        first = TransferGovernor(bytes_per_second=10 * MB, background_share=0.5, shared_dir=tmpdirname)
+        second = TransferGovernor(bytes_per_second=10 * MB, background_share=0.5, shared_dir=tmpdirname)
+        for _ in range(5):
+            first.throttle(MB, Priority.BACKGROUND)
+            second.throttle(MB, Priority.BACKGROUND)
+
+        assert (Path(tmpdirname) / "bandwidth-background").exists()
+        assert sum(sleeps) == pytest.approx(1.0)
+
+
+def test__athrottle__shared_dir() -> None:
+    """
+    Тест проверяет, что athrottle с общей директорией работает из event loop.
+    """
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        governor = TransferGovernor(bytes_per_second=100 * MB, shared_dir=tmpdirname)
+        asyncio.run(governor.athrottle(MB))
+
+
+def test__transfer__foreground_goes_first() -> None:
+    """
+    Тест проверяет, что ожидающая foreground передача получает слот раньше фоновой.
+    """
+    governor = TransferGovernor(max_transfers=1)
+    order: list[str] = []
+
+    def run(name: str, priority: Priority) -> None:
+        with governor.transfer(priority):
+            order.append(name)
+
+    with governor.transfer():
+        background = threading.Thread(target=run, args=("background", Priority.BACKGROUND))
+        background.start()
+        time.sleep(0.1)
+        foreground = threading.Thread(target=run, args=("foreground", Priority.FOREGROUND))
+        foreground.start()
+        time.sleep(0.1)
+    background.join()
+    foreground.join()
+
+    assert order == ["foreground", "background"]
+
+
+def test__atransfer__limits_concurrency() -> None:
+    """
+    Тест проверяет, что atransfer не пускает больше max_transfers одновременных передач.
+    """
+    governor = TransferGovernor(max_transfers=2)
+    active = 0
+    peak = 0
+
+    async def transfer() -> None:
+        nonlocal active, peak
+        async with governor.atransfer():
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async def main() -> None:
+        await asyncio.gather(*(transfer() for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak == 2
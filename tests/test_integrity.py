@@ -0,0 +1,181 @@
+import base64
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+
+from vlmsw import pull_converted_weights
+from vlmsw.exceptions import IntegrityException
+from vlmsw.integrity import (
+    HashingReader,
+    Manifest,
+    StreamHasher,
+    compose_etag,
+    checksum_sha256_from_headers,
+    representation_sha256_from_headers,
+    verify_etag,
+)
+
+from . import FakeS3Client
+
+PART_SIZE = 8 * 1024
+
+
+def test__stream_hasher__parts_and_sha256() -> None:
+    """
+    Тест проверяет, что StreamHasher, получая поток блоками произвольного размера,
+    считает sha256 всего потока и md5 каждой части.
+    """
+    data = os.urandom(3 * PART_SIZE + 123)
+    hasher = StreamHasher(PART_SIZE)
+    for start in range(0, len(data), 1000):
+        hasher.update(data[start : start + 1000])
+
+    assert hasher.sha256() == hashlib.sha256(data).hexdigest()
+    assert hasher.part_digests() == [
+        hashlib.md5(data[i : i + PART_SIZE]).digest() for i in range(0, len(data), PART_SIZE)
+    ]
+
+
+def test__compose_etag__single_and_multipart() -> None:
+    """
+    Тест проверяет, что ETag собирается по правилам S3 для обычной и multipart загрузки.
+    """
+    data = os.urandom(2 * PART_SIZE)
+    digests = [hashlib.md5(data[:PART_SIZE]).digest(), hashlib.md5(data[PART_SIZE:]).digest()]
+
+    assert compose_etag([hashlib.md5(data).digest()], multipart=False) == hashlib.md5(data).hexdigest()
+    assert compose_etag(digests, multipart=True) == f"{hashlib.md5(b''.join(digests)).hexdigest()}-2"
+
+
+def test__verify_etag__mismatch_and_non_md5() -> None:
+    """
+    Тест проверяет, что несовпадение ETag вызывает IntegrityException,
+    а ETag не на основе md5 (например, SSE-KMS) пропускается.
+    """
+    digests = [hashlib.md5(b"weights").digest()]
+    verify_etag(f'"{digests[0].hex()}"', digests, "weights")
+    verify_etag("not-an-md5-etag", digests, "weights")
+
+    with pytest.raises(IntegrityException):
+        verify_etag(hashlib.md5(b"other").hexdigest(), digests, "weights")
+
+
+def test__hashing_reader__reread_is_not_hashed_twice() -> None:
+    """
+    Тест проверяет, что повторное чтение после seek назад не попадает в хеш дважды,
+    а finish() дочитывает непрочитанный хвост файла.
+    """
+    data = os.urandom(5 * PART_SIZE)
+    reader = HashingReader(io.BytesIO(data), StreamHasher(PART_SIZE))
+    reader.read(5000)
+    reader.seek(0)
+    reader.read(6000)
+    reader.read(PART_SIZE)
+    reader.seek(100)
+    reader.read(100)
+    hasher = reader.finish()
+
+    assert hasher.size == len(data)
+    assert hasher.sha256() == hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        {"repr-digest": "sha-256=:{b64}:"},
+        {"digest": "md5=abc, sha-256={b64}"},
+        {"x-checksum-sha256": "{hex}"},
+    ],
+)
+def test__sha256_from_headers__supported_headers(headers: dict[str, str]) -> None:
+    """
+    Тест проверяет разбор sha256 из заголовков Repr-Digest, Digest и X-Checksum-Sha256.
+    """
+    digest = hashlib.sha256(b"weights").digest()
+    values = {"b64": base64.b64encode(digest).decode(), "hex": digest.hex()}
+    headers = {name: value.format(**values) for name, value in headers.items()}
+
+    found = representation_sha256_from_headers(headers) or checksum_sha256_from_headers(headers)
+    assert found == digest.hex()
+    assert representation_sha256_from_headers({}) is None
+    assert checksum_sha256_from_headers({}) is None
+
+
+def test__manifest__metadata_only_validity() -> None:
+    """
+    Тест проверяет, что манифест признает файл актуальным по размеру и mtime,
+    а после изменения файла или при другом ETag - нет.
+    """
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        directory = Path(tmpdirname)
+        weights_path = directory / "model.engine"
+        weights_path.write_bytes(b"weights")
+        Manifest(directory).record(weights_path, sha256="abc", etag="etag")
+
+        manifest = Manifest(directory)
+        assert manifest.is_valid(weights_path, etag='"etag"')
+        assert not manifest.is_valid(weights_path, etag="other")
+
+        weights_path.write_bytes(b"corrupted weights")
+        assert not Manifest(directory).is_valid(weights_path)
+
+
+def test__manifest__concurrent_records_are_merged() -> None:
+    """
+    Тест проверяет, что одновременная запись разных файлов одной директории
+    из нескольких потоков не теряет записи манифеста.
+    """
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        directory = Path(tmpdirname)
+        paths = [directory / f"model_{i}.engine" for i in range(16)]
+        for path in paths:
+            path.write_bytes(path.name.encode())
+
+        threads = [threading.Thread(target=Manifest(directory).record, args=(path,)) for path in paths]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert set(Manifest(directory).entries) == {path.name for path in paths}
+
+
+@pytest.mark.parametrize("part_size", [None, PART_SIZE])
+def test__download_weights_file__verified_and_cached(monkeypatch, part_size: int | None) -> None:
+    """
+    Тест проверяет, что download_weights_file скачивает обычный и multipart объект,
+    сверяет ETag и при повторном вызове не скачивает файл, если он не изменился.
+    """
+    s3_client = FakeS3Client()
+    data = os.urandom(3 * PART_SIZE + 17)
+    s3_client.put("bucket", "model/1/model.engine", data, part_size=part_size)
+    monkeypatch.setattr(pull_converted_weights, "get_s3_client", lambda: s3_client)
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        save_to = Path(tmpdirname)
+        path = pull_converted_weights.download_weights_file("model.engine", "model", "1", "bucket", save_to)
+        assert path.read_bytes() == data
+        assert len(s3_client.get_requests) == (4 if part_size else 1)
+
+        pull_converted_weights.download_weights_file("model.engine", "model", "1", "bucket", save_to)
+        assert len(s3_client.get_requests) == (4 if part_size else 1)
+
+
+def test__download_weights_file__corrupted_object(monkeypatch) -> None:
+    """
+    Тест проверяет, что при несовпадении ETag файл не появляется в директории назначения.
+    """
+    s3_client = FakeS3Client()
+    s3_client.put("bucket", "model/1/model.engine", b"weights")
+    s3_client.objects[("bucket", "model/1/model.engine")]["data"] = b"corrupt"
+    monkeypatch.setattr(pull_converted_weights, "get_s3_client", lambda: s3_client)
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        with pytest.raises(IntegrityException):
+            pull_converted_weights.download_weights_file("model.engine", "model", "1", "bucket", Path(tmpdirname))
+        assert not any(path.name.startswith("model.engine") for path in Path(tmpdirname).iterdir())
@@ -0,0 +1,85 @@
+import os
+import tempfile
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+import zstandard
+
+from vlmsw import push_converted_weights as push_converted_weights_module
+from vlmsw.integrity import Manifest
+from vlmsw.push_converted_weights import upload_weights_file
+from vlmsw.settings.settings import settings
+
+from . import FakeS3Client, boto3_client_over
+
+MB = 1024 * 1024
+KEY = "model/1/model.engine"
+
+
+@pytest.fixture
+def storage(monkeypatch) -> FakeS3Client:
+    """
+    S3 в памяти, в который загружает настоящий boto3 клиент.
+    """
+    fake = FakeS3Client()
+    # контрольные суммы CRC новых версий botocore меняют формат тела запроса
+    monkeypatch.setenv("AWS_REQUEST_CHECKSUM_CALCULATION", "when_required")
+    client = boto3_client_over(fake)
+    monkeypatch.setattr(push_converted_weights_module, "get_s3_client", lambda: client)
+    return fake
+
+
+@pytest.fixture
+def tmpdir_path() -> Iterator[Path]:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield Path(tmpdir)
+
+
+@pytest.mark.parametrize("size", [0, 1000, 20 * MB])
+def test__upload_weights_file__single_and_multipart(storage, tmpdir_path, size: int) -> None:
+    """
+    Тест проверяет загрузку пустого, небольшого и multipart файла со сверкой ETag и записью в манифест.
+    """
+    weights_path = tmpdir_path / "model.engine"
+    weights_path.write_bytes(os.urandom(size))
+
+    assert upload_weights_file(weights_path, "model", "1", "bucket")
+
+    obj = storage.objects[("bucket", KEY)]
+    assert obj["data"] == weights_path.read_bytes()
+    assert ("-" in obj["etag"]) == (size >= 8 * MB)
+    assert Manifest(tmpdir_path).is_valid(weights_path, etag=obj["etag"])
+
+
+def test__upload_weights_file__compression_at_rest(storage, tmpdir_path, monkeypatch) -> None:
+    """
+    Тест проверяет, что при сжатии сжимаемый файл хранится под ключом .zst, а прежняя несжатая копия удаляется.
+    """
+    weights_path = tmpdir_path / "model.engine"
+    weights_path.write_bytes(b"".join(b"layer.%d.weight " % (i % 97) for i in range(600_000)))
+    storage.put("bucket", KEY, b"stale weights")
+    monkeypatch.setattr(settings, "COMPRESSION_AT_REST", True)
+
+    assert upload_weights_file(weights_path, "model", "1", "bucket")
+
+    assert ("bucket", KEY) not in storage.objects
+    compressed = storage.objects[("bucket", f"{KEY}.zst")]["data"]
+    assert len(compressed) < weights_path.stat().st_size
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(compressed) == weights_path.read_bytes()
+
+
+def test__upload_weights_file__read_only_directory(storage, tmpdir_path, monkeypatch) -> None:
+    """
+    Тест проверяет, что невозможность записать манифест рядом с файлом не делает успешную загрузку ошибкой.
+    """
+    weights_path = tmpdir_path / "model.engine"
+    weights_path.write_bytes(os.urandom(1000))
+
+    def read_only(*_, **__) -> None:
+        raise PermissionError("Read-only file system")
+
+    monkeypatch.setattr(Manifest, "record", read_only)
+
+    assert upload_weights_file(weights_path, "model", "1", "bucket")
+    assert storage.objects[("bucket", KEY)]["data"] == weights_path.read_bytes()
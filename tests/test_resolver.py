@@ -0,0 +1,123 @@
+import pytest
+from vlmrs.models.yolov5 import YoloV5Schema
+from vlmrs.schema import ShapeModel
+
+from vlmsw import resolver as resolver_module
+from vlmsw.exceptions import NotFoundModelException
+from vlmsw.resolver import ConvertedWeightsIndex, RuntimeTags, resolve_converted_weights
+from vlmsw.settings.settings import settings
+
+from . import FakeS3Client, SchemaFixture
+
+ENGINES = [
+    "yolov5_cuda11.4_trt8.4.3_cc8.6.engine",
+    "yolov5_cuda11.7_trt8.4.3_cc8.6.engine",
+    "yolov5_cuda12.1_trt8.4.3_cc8.6.engine",
+    "yolov5_cuda11.7_trt8.6.1_cc8.6.engine",
+    "yolov5_cuda11.7_trt8.4.3_sm75.engine",
+]
+ONNX_FILES = ["yolov5_onnx1.12.0.onnx", "yolov5_onnx1.17.0.onnx", "yolov5.onnx"]
+
+
+@pytest.mark.parametrize(
+    "file_name, expected",
+    [
+        (
+            "yolov5_cuda11.7_trt8.4.3_cc8.6.engine",
+            RuntimeTags(cuda_version="11.7", trt_version="8.4.3", compute_capability="8.6"),
+        ),
+        (
+            "yolov5-CUDA-12.1-TensorRT-8.6.1-sm86.plan",
+            RuntimeTags(cuda_version="12.1", trt_version="8.6.1", compute_capability="8.6"),
+        ),
+        ("yolov5_onnx1.17.0.onnx", RuntimeTags(onnx_version="1.17.0")),
+        ("yolov5.onnx", RuntimeTags()),
+    ],
+)
+def test__runtime_tags__from_file_name(file_name: str, expected: RuntimeTags) -> None:
+    """
+    Тест проверяет разбор тегов среды выполнения из имени файла, sm86 и cc8.6 приводятся к одному виду.
+    """
+    assert RuntimeTags.from_file_name(file_name) == expected
+
+
+@pytest.mark.parametrize(
+    "model_schema",
+    [{"schema": YoloV5Schema, "shape": ShapeModel(channels=3, height=640, width=640), "weights_type": "trt"}],
+    indirect=True,
+)
+def test__runtime_tags__converted_trt_weights_name(model_schema) -> None:
+    """
+    Тест проверяет, что теги из имени, которое строит vlmrs, совпадают с версиями схемы и находятся индексом.
+    """
+    schema_fixture: SchemaFixture = model_schema
+    runtime = RuntimeTags.from_schema(schema_fixture.schema)
+
+    assert RuntimeTags.from_file_name(schema_fixture.converted_weights_name) == runtime
+    assert ConvertedWeightsIndex([schema_fixture.converted_weights_name]).resolve_trt(runtime) == (
+        schema_fixture.converted_weights_name
+    )
+
+
+@pytest.mark.parametrize(
+    "runtime, expected",
+    [
+        # самая новая CUDA того же major, не новее среды выполнения
+        (RuntimeTags(cuda_version="11.8", trt_version="8.4.3", compute_capability="8.6"), ENGINES[1]),
+        (RuntimeTags(cuda_version="11.7", trt_version="8.4.3", compute_capability="8.6"), ENGINES[1]),
+        (RuntimeTags(cuda_version="11.5", trt_version="8.4.3", compute_capability="8.6"), ENGINES[0]),
+        (RuntimeTags(cuda_version="12.4", trt_version="8.4.3", compute_capability="8.6"), ENGINES[2]),
+        (RuntimeTags(cuda_version="11.8", trt_version="8.4.3", compute_capability="sm75"), ENGINES[4]),
+        (RuntimeTags(cuda_version="11.8", trt_version="8.6.1", compute_capability="8.6"), ENGINES[3]),
+        # TensorRT сравнивается по компонентам версии из имени файла
+        (RuntimeTags(cuda_version="11.8.0", trt_version="8.4.3.1", compute_capability="8.6"), ENGINES[1]),
+        (RuntimeTags(cuda_version="11.8", trt_version="8.6.1.6", compute_capability="sm_86"), ENGINES[3]),
+        # движок под более новую CUDA, другой TensorRT или другую архитектуру не подходит
+        (RuntimeTags(cuda_version="11.2", trt_version="8.4.3", compute_capability="8.6"), None),
+        (RuntimeTags(cuda_version="11.8", trt_version="8.5.1", compute_capability="8.6"), None),
+        (RuntimeTags(cuda_version="11.8", trt_version="8.4", compute_capability="8.6"), None),
+        (RuntimeTags(cuda_version="11.8", trt_version="8.4.3", compute_capability="8.9"), None),
+        (RuntimeTags(trt_version="8.4.3", compute_capability="8.6"), None),
+    ],
+)
+def test__converted_weights_index__resolve_trt(runtime: RuntimeTags, expected: str | None) -> None:
+    """
+    Тест проверяет правила совместимости движков TensorRT со средой выполнения.
+    """
+    assert ConvertedWeightsIndex(ENGINES + ONNX_FILES).resolve_trt(runtime) == expected
+
+
+@pytest.mark.parametrize(
+    "runtime, expected",
+    [
+        (RuntimeTags(onnx_version="1.17.0"), ONNX_FILES[1]),
+        (RuntimeTags(onnx_version="1.17.0rc1"), ONNX_FILES[1]),
+        (RuntimeTags(onnx_version="1.15.0.dev20230601"), ONNX_FILES[0]),
+        (RuntimeTags(onnx_version="1.14.1"), ONNX_FILES[0]),
+        (RuntimeTags(onnx_version="1.10.0"), ONNX_FILES[2]),
+        (RuntimeTags(), ONNX_FILES[1]),
+    ],
+)
+def test__converted_weights_index__resolve_onnx(runtime: RuntimeTags, expected: str) -> None:
+    """
+    Тест проверяет выбор файла ONNX: самый новый не новее среды, файл без версии подходит всегда.
+    """
+    assert ConvertedWeightsIndex(ENGINES + ONNX_FILES).resolve_onnx(runtime) == expected
+
+
+def test__resolve_converted_weights__single_listing(monkeypatch) -> None:
+    """
+    Тест проверяет выбор весов по одному листингу бакета и ошибку при отсутствии совместимых весов.
+    """
+    s3_client = FakeS3Client()
+    for file_name in ENGINES:
+        s3_client.put(settings.artifacts_converted_bucket, f"yolov5/1/{file_name}", b"engine")
+    s3_client.put(settings.artifacts_converted_bucket, "yolov5/2/yolov5_cuda11.8_trt8.4.3_cc8.6.engine", b"engine")
+    monkeypatch.setattr(resolver_module, "get_s3_client", lambda: s3_client)
+
+    runtime = RuntimeTags(cuda_version="11.8", trt_version="8.4.3", compute_capability="8.6")
+    assert resolve_converted_weights("yolov5", "1", runtime) == ENGINES[1]
+    assert s3_client.get_requests == []
+
+    with pytest.raises(NotFoundModelException):
+        resolve_converted_weights("yolov5", "1", runtime, weights_type="onnx")
@@ -0,0 +1,172 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator, Callable
+
+import httpx
+import pytest
+
+from vlmsw.pull import ModelEvent, _poll_new_versions, _watch_server_events
+from vlmsw.settings.settings import settings
+
+
+@pytest.fixture(autouse=True)
+def fast_watch(monkeypatch) -> None:
+    """
+    Убирает паузы между запросами и задает адреса сервиса.
+    """
+    monkeypatch.setattr(settings, "WATCH_POLL_INTERVAL", 0.0)
+    monkeypatch.setattr(settings, "WATCH_EVENTS_MAX_FAILURES", 3)
+    monkeypatch.setattr(settings, "MODEL_STORAGE_ENDPOINT", "http://registry/models")
+    monkeypatch.setattr(settings, "MODEL_STORAGE_EVENTS_ENDPOINT", "http://registry/events")
+
+
+def collect(
+    watcher: Callable[[httpx.AsyncClient, set[str] | None], AsyncIterator[ModelEvent]],
+    handler: Callable[[httpx.Request], httpx.Response],
+    models: set[str] | None = None,
+    limit: int | None = None,
+) -> list[ModelEvent]:
+    """
+    Собирает события наблюдателя, пока он не завершится или не выдаст `limit` событий.
+    """
+
+    async def run() -> list[ModelEvent]:
+        events: list[ModelEvent] = []
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            events_iter = watcher(client, models)
+            async for event in events_iter:
+                events.append(event)
+                if limit is not None and len(events) >= limit:
+                    break
+            await events_iter.aclose()
+        return events
+
+    return asyncio.run(run())
+
+
+def sse(*events: dict, event_ids: bool = True) -> bytes:
+    lines = []
+    for number, event in enumerate(events, start=1):
+        if event_ids:
+            lines.append(f"id: {number}")
+        lines.append(f"data: {json.dumps(event)}")
+        lines.append("")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def test__watch_server_events__parses_stream() -> None:
+    """
+    Тест проверяет разбор событий потока: неизвестные события пропускаются, чужие модели отфильтровываются.
+    """
+    body = sse(
+        {"type": "new_version", "model": "yolo", "version": "2"},
+        {"type": "unknown", "model": "yolo", "version": "2"},
+        {"type": "new_version", "model": "other", "version": "7"},
+        {"type": "new_converted_file", "model": "yolo", "version": "2", "file_name": "yolo.engine"},
+    )
+    last_event_ids = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        last_event_ids.append(request.headers.get("last-event-id"))
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body)
+
+    events = collect(_watch_server_events, handler, models={"yolo"}, limit=3)
+
+    assert [(event.type, event.version, event.file_name) for event in events] == [
+        ("new_version", "2", None),
+        ("new_converted_file", "2", "yolo.engine"),
+        ("new_version", "2", None),
+    ]
+    # после переподключения поток продолжается с последнего полученного события
+    assert last_event_ids == [None, "4"]
+
+
+def test__watch_server_events__not_supported() -> None:
+    """
+    Тест проверяет, что без поддержки потока событий наблюдатель сразу завершается.
+    """
+    events = collect(_watch_server_events, lambda request: httpx.Response(404, json={"detail": "Not Found"}))
+
+    assert events == []
+
+
+def test__watch_server_events__falls_back_after_failures() -> None:
+    """
+    Тест проверяет, что после WATCH_EVENTS_MAX_FAILURES ошибок подряд наблюдатель уходит на опрос.
+    """
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    events = collect(_watch_server_events, handler)
+
+    assert events == []
+    assert len(requests) == settings.WATCH_EVENTS_MAX_FAILURES
+
+
+def test__poll_new_versions__diff() -> None:
+    """
+    Тест проверяет, что первый ответ задает базу, а дальше выдаются только новые версии наблюдаемых моделей.
+    """
+    catalogs = [
+        {"yolo": ["1"], "other": ["1"]},
+        {"yolo": ["1"], "other": ["1"]},
+        {"yolo": ["1", "2"], "other": ["1", "2"]},
+        {"yolo": ["1", "2", "3"], "other": ["1", "2"]},
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        catalog = catalogs.pop(0) if len(catalogs) > 1 else catalogs[0]
+        return httpx.Response(200, json=catalog)
+
+    events = collect(_poll_new_versions, handler, models={"yolo"}, limit=2)
+
+    assert [(event.model, event.version) for event in events] == [("yolo", "2"), ("yolo", "3")]
+
+
+def test__poll_new_versions__etag_updated_on_every_200() -> None:
+    """
+    Тест проверяет, что ETag обновляется на каждом ответе 200, даже если каталог не изменился.
+    """
+    responses = [
+        httpx.Response(200, headers={"etag": '"v1"'}, json={"yolo": ["1"]}),
+        httpx.Response(200, headers={"etag": '"v2"'}, json={"yolo": ["1"]}),
+        httpx.Response(304),
+        httpx.Response(200, headers={"etag": '"v3"'}, json={"yolo": ["1", "2"]}),
+    ]
+    if_none_match = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if_none_match.append(request.headers.get("if-none-match"))
+        return responses.pop(0)
+
+    events = collect(_poll_new_versions, handler, limit=1)
+
+    assert [(event.model, event.version) for event in events] == [("yolo", "2")]
+    assert if_none_match == [None, '"v1"', '"v2"', '"v2"']
+
+
+@pytest.mark.parametrize(
+    "malformed",
+    [
+        httpx.Response(200, content=b"<html>Bad Gateway</html>"),
+        httpx.Response(200, json=["yolo"]),
+        httpx.Response(200, json={"detail": "Service Unavailable"}),
+        httpx.Response(200, json={"yolo": [1, None]}),
+    ],
+)
+def test__poll_new_versions__malformed_catalog(malformed: httpx.Response) -> None:
+    """
+    Тест проверяет, что ответ реестра, который не является JSON вида {модель: [версии]}, не останавливает опрос.
+    """
+    responses = [
+        httpx.Response(200, json={"yolo": ["1"]}),
+        malformed,
+        httpx.Response(200, json={"yolo": ["1", "2"]}),
+    ]
+
+    events = collect(_poll_new_versions, lambda request: responses.pop(0), limit=1)
+
+    assert [(event.model, event.version) for event in events] == [("yolo", "2")]
@@ -0,0 +1,157 @@
+import json
+import os
+import shutil
+import socket
+import socketserver
+import threading
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from vlmsw.integrity import Manifest
+from vlmsw.pull_converted_weights import download_weights_file
+from vlmsw.settings.settings import settings
+
+
+class _CacheDaemonHandler(socketserver.StreamRequestHandler):
+    """
+    Serves one pull request: a JSON line in, a JSON line with the store path and the file descriptor out.
+    """
+
+    server: "CacheDaemon"
+
+    def handle(self) -> None:
+        fd = None
+        try:
+            request = json.loads(self.rfile.readline())
+            path = self.server.fetch(**request)
+            entry = Manifest(path.parent).get_valid(path)
+            response = {
+                "path": str(path),
+                "size": path.stat().st_size,
+                "sha256": entry.sha256 if entry else None,
+                "etag": entry.etag if entry else None,
+            }
+            fd = os.open(path, os.O_RDONLY)
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            logger.exception("Cache daemon failed to serve the request")
+            self.request.sendall(json.dumps({"error": str(err)}).encode() + b"\n")
+            return
+
+        try:
+            socket.send_fds(self.request, [json.dumps(response).encode() + b"\n"], [fd])
+        finally:
+            os.close(fd)
+
+
+class CacheDaemon(socketserver.ThreadingUnixStreamServer):
+    """
+    A host-local daemon owning one on-disk store of converted weights and one pooled S3 client.
+
+    Processes of the host ask it for the weights over a Unix-domain socket; each file is fetched from upstream
+    once per host, concurrent requests for the same file wait for the single download. Only the converted
+    artifacts bucket is served, and the socket is open to the owner and the configured group only.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        socket_path: str | Path,
+        store_dir: str | Path,
+        socket_mode: int | None = None,
+        socket_group: str | None = None,
+    ):
+        """
+        Initialize the CacheDaemon object.
+
+        Args:
+            socket_path: The path of the Unix-domain socket to listen on.
+            store_dir: The directory of the on-disk store.
+            socket_mode: The permissions of the socket, `CACHE_DAEMON_SOCKET_MODE` by default.
+            socket_group: The group owning the socket, `CACHE_DAEMON_SOCKET_GROUP` by default.
+        """
+        self.socket_path = Path(socket_path)
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self._locks: dict[tuple[str, ...], threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+        # сокет, оставшийся от упавшего демона, мешает bind
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        self.socket_path.unlink(missing_ok=True)
+        super().__init__(str(self.socket_path), _CacheDaemonHandler)
+        try:
+            socket_group = socket_group or settings.CACHE_DAEMON_SOCKET_GROUP
+            if socket_group:
+                shutil.chown(self.socket_path, group=socket_group)
+            os.chmod(self.socket_path, settings.CACHE_DAEMON_SOCKET_MODE if socket_mode is None else socket_mode)
+        except BaseException:
+            self.server_close()
+            raise
+
+    def fetch(self, weights_name: str, model_name: str, model_version: str, bucket_name: str, **_: Any) -> Path:
+        """
+        Returns the path of the weights file in the store, downloading it from upstream if needed.
+
+        Args:
+            weights_name: The name of the weights file.
+            model_name: The name of the model.
+            model_version: The version of the model.
+            bucket_name: The name of the S3 bucket, only the converted artifacts bucket is served.
+
+        Returns:
+            Path: The path of the weights file in the store.
+
+        Raises:
+            ValueError: If the bucket is not the converted artifacts bucket or the location is invalid.
+        """
+        if bucket_name != settings.artifacts_converted_bucket:
+            raise ValueError(f"Bucket {bucket_name!r} is not served by the cache daemon")
+        parts = (bucket_name, model_name, model_version, weights_name)
+        if any(not part or part in (".", "..") or "/" in part or "\0" in part for part in parts):
+            raise ValueError(f"Invalid weights location: {parts}")
+
+        with self._locks_guard:
+            lock = self._locks.setdefault(parts, threading.Lock())
+        with lock:
+            path = download_weights_file(
+                weights_name,
+                model_name,
+                model_version,
+                bucket_name,
+                self.store_dir / bucket_name / model_name / model_version,
+                use_cache_daemon=False,
+            )
+            # клиенты получают жесткие ссылки на файл хранилища, поэтому он только для чтения
+            os.chmod(path, 0o444)
+        return path
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.socket_path.unlink(missing_ok=True)
+
+
+def serve(socket_path: str | None = None, store_dir: str | None = None) -> None:
+    """
+    Runs the cache daemon until interrupted.
+
+    Args:
+        socket_path: The path of the Unix-domain socket, `CACHE_DAEMON_SOCKET` by default.
+        store_dir: The directory of the on-disk store, `CACHE_DAEMON_STORE` by default.
+    """
+    socket_path = socket_path or settings.CACHE_DAEMON_SOCKET
+    if not socket_path:
+        raise ValueError("CACHE_DAEMON_SOCKET is not set")
+
+    with CacheDaemon(socket_path, store_dir or settings.CACHE_DAEMON_STORE) as daemon:
+        logger.info("Cache daemon listens on {}, store {}", daemon.socket_path, daemon.store_dir)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Cache daemon stopped")
+
+
+if __name__ == "__main__":
+    serve()
@@ -1,10 +1,12 @@
+from functools import lru_cache
 from typing import Any
 
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from loguru import logger
 
-from vlmlflow.settings.settings import settings
+from vlmsw.settings.settings import settings
 
 
 def extract_file_info(objects_response: dict[str, Any], keyword: str) -> list[dict[str, Any]]:
@@ -29,6 +31,21 @@ def extract_file_info(objects_response: dict[str, Any], keyword: str) -> list[di
     return matching_files
 
 
+@lru_cache(maxsize=None)
+def get_s3_client() -> Any:
+    """
+    Returns the S3 client shared by the process, so its connection pool is reused between transfers.
+
+    Returns:
+        Any: The boto3 S3 client.
+    """
+    return boto3.client(
+        "s3",
+        endpoint_url=settings.mlflow_s3_endpoint_url,
+        config=Config(max_pool_connections=max(10, settings.TRANSFER_MAX_WORKERS)),
+    )
+
+
 def is_bucket_exists(bucket_name: str) -> bool:
     """
     Checks if a bucket exists.
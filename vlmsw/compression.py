@@ -0,0 +1,117 @@
+import math
+import os
+from collections import Counter
+from pathlib import Path
+
+import zstandard
+
+from vlmsw.exceptions import IntegrityException
+from vlmsw.settings.settings import settings
+
+ZSTD_ENCODING = "zstd"
+# суффикс ключа сжатых объектов в S3
+ZSTD_SUFFIX = ".zst"
+
+_SAMPLE_SIZE = 64 * 1024
+
+
+def byte_entropy(data: bytes) -> float:
+    """
+    Calculates the Shannon entropy of the bytes.
+
+    Args:
+        data (bytes): The sample of bytes.
+
+    Returns:
+        float: The entropy in bits per byte, from 0 to 8.
+    """
+    if not data:
+        return 0.0
+    total = len(data)
+    return -sum(count / total * math.log2(count / total) for count in Counter(data).values())
+
+
+def is_compressible(path: Path) -> bool:
+    """
+    Decides whether the file is worth compressing.
+
+    Small files and files whose samples from the beginning, the middle and the end look already
+    compressed (high entropy) are stored as is.
+
+    Args:
+        path (Path): The path to the file.
+
+    Returns:
+        bool: True if the file should be compressed.
+    """
+    size = path.stat().st_size
+    if size < settings.COMPRESSION_MIN_SIZE:
+        return False
+
+    offsets = {0, size // 2, max(0, size - _SAMPLE_SIZE)}
+    with open(path, "rb") as fh:
+        samples = [os.pread(fh.fileno(), _SAMPLE_SIZE, offset) for offset in offsets]
+    entropy = sum(byte_entropy(sample) for sample in samples) / len(samples)
+    return entropy < settings.COMPRESSION_ENTROPY_THRESHOLD
+
+
+def get_compressor() -> zstandard.ZstdCompressor:
+    """
+    Returns:
+        zstandard.ZstdCompressor: The compressor with the configured level and number of threads.
+    """
+    return zstandard.ZstdCompressor(level=settings.COMPRESSION_LEVEL, threads=settings.COMPRESSION_THREADS)
+
+
+def get_decompressor() -> zstandard.ZstdDecompressor:
+    """
+    Returns:
+        zstandard.ZstdDecompressor: The decompressor.
+    """
+    return zstandard.ZstdDecompressor()
+
+
+class StreamDecompressor:
+    """
+    Incrementally decompresses a zstd stream of one or more frames while it is being transferred.
+    """
+
+    def __init__(self) -> None:
+        self._decompressor = get_decompressor()
+        self._frame = self._decompressor.decompressobj()
+        self._frame_started = False
+
+    def decompress(self, data: bytes) -> bytes:
+        """
+        Decompress the next block of the stream.
+
+        Args:
+            data: The block of compressed bytes that directly follows the previously fed ones.
+
+        Returns:
+            bytes: The decompressed bytes available so far.
+        """
+        chunks = []
+        while data:
+            self._frame_started = True
+            chunks.append(self._frame.decompress(data))
+            if not self._frame.eof:
+                break
+            # следующий кадр начинается в остатке текущего блока
+            data = self._frame.unused_data
+            self._frame = self._decompressor.decompressobj()
+            self._frame_started = False
+        return b"".join(chunks)
+
+    def finish(self, name: str) -> None:
+        """
+        Check that the stream ended on a frame boundary.
+
+        Args:
+            name: The name of the transferred file, used in messages.
+
+        Raises:
+            IntegrityException: If the last frame is incomplete.
+        """
+        if self._frame_started:
+            raise IntegrityException(f"Truncated zstd stream of {name}")
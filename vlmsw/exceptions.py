@@ -8,3 +8,9 @@ class NotFoundModelException(Exception):
     """
     Raised when the model does not exist.
     """
+
+
+class IntegrityException(Exception):
+    """
+    Raised when the transferred file does not match the expected digest.
+    """
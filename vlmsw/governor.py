@@ -0,0 +1,298 @@
+import asyncio
+import fcntl
+import os
+import struct
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from vlmsw.settings.settings import settings
+
+_BUCKET_STATE = struct.Struct("dd")
+_SLOT_POLL_INTERVAL = 0.05
+# значение по умолчанию в configure: оставить текущую настройку
+_KEEP: Any = object()
+
+
+class Priority(IntEnum):
+    """
+    Priority class of a transfer.
+    """
+
+    FOREGROUND = 0
+    BACKGROUND = 1
+
+
+class _TokenBucket:
+    """
+    A token bucket of bytes with a burst of one second of traffic.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def reserve(self, nbytes: int) -> float:
+        """
+        Takes `nbytes` tokens, possibly going into debt, and returns how long the caller has to wait.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate) - nbytes
+        self.updated = now
+        return max(0.0, -self.tokens / self.rate)
+
+
+class _SharedTokenBucket:
+    """
+    A token bucket whose state is kept in a file, so all processes of the host share one budget.
+    """
+
+    def __init__(self, path: Path, rate: float):
+        self.path = path
+        self.rate = rate
+
+    def reserve(self, nbytes: int) -> float:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.pread(fd, _BUCKET_STATE.size, 0)
+            now = time.monotonic()
+            tokens, updated = _BUCKET_STATE.unpack(raw) if len(raw) == _BUCKET_STATE.size else (self.rate, now)
+            tokens = min(self.rate, tokens + (now - updated) * self.rate) - nbytes
+            os.pwrite(fd, _BUCKET_STATE.pack(tokens, now), 0)
+        finally:
+            os.close(fd)
+        return max(0.0, -tokens / self.rate)
+
+
+class TransferGovernor:
+    """
+    A process-wide governor of the transfer bandwidth and the number of simultaneous transfers.
+
+    Every download and upload takes a slot with `transfer`/`atransfer` and reports the transferred bytes with
+    `throttle`/`athrottle`. Background transfers get at most `background_share` of the bandwidth and yield
+    their slots to waiting foreground ones. If `shared_dir` is set, the bandwidth (including the background
+    share) and the slots are shared with the other processes of the host through the files in this directory.
+    """
+
+    def __init__(
+        self,
+        bytes_per_second: int | None = None,
+        max_transfers: int | None = None,
+        background_share: float = 1.0,
+        shared_dir: str | Path | None = None,
+    ):
+        """
+        Initialize the TransferGovernor object.
+
+        Args:
+            bytes_per_second: The bandwidth limit, None for unlimited.
+            max_transfers: The limit of simultaneous transfers, None for unlimited.
+            background_share: The share of the bandwidth available to background transfers.
+            shared_dir: The directory for the cross-process coordination, None to govern this process only.
+        """
+        self._condition = threading.Condition()
+        self._active = 0
+        self._foreground_waiting = 0
+        self.bytes_per_second: int | None = None
+        self.max_transfers: int | None = None
+        self.background_share = 1.0
+        self.shared_dir: Path | None = None
+        self.configure(bytes_per_second, max_transfers, background_share, shared_dir)
+
+    def configure(
+        self,
+        bytes_per_second: int | None = _KEEP,
+        max_transfers: int | None = _KEEP,
+        background_share: float = _KEEP,
+        shared_dir: str | Path | None = _KEEP,
+    ) -> None:
+        """
+        Change the limits. Can be called at runtime, the running transfers pick up the new limits.
+        Omitted arguments keep their current values.
+
+        Args:
+            bytes_per_second: The bandwidth limit, None for unlimited.
+            max_transfers: The limit of simultaneous transfers, None for unlimited.
+            background_share: The share of the bandwidth available to background transfers.
+            shared_dir: The directory for the cross-process coordination, None to govern this process only.
+        """
+        with self._condition:
+            if bytes_per_second is not _KEEP:
+                self.bytes_per_second = bytes_per_second
+            if max_transfers is not _KEEP:
+                self.max_transfers = max_transfers
+            if background_share is not _KEEP:
+                self.background_share = background_share
+            if shared_dir is not _KEEP:
+                self.shared_dir = Path(shared_dir) if shared_dir else None
+            if self.shared_dir is not None:
+                self.shared_dir.mkdir(parents=True, exist_ok=True)
+
+            self._bucket: _TokenBucket | _SharedTokenBucket | None = None
+            self._background_bucket: _TokenBucket | _SharedTokenBucket | None = None
+            if self.bytes_per_second:
+                self._bucket = self._make_bucket("bandwidth", self.bytes_per_second)
+                if self.background_share < 1.0:
+                    self._background_bucket = self._make_bucket(
+                        "bandwidth-background", self.bytes_per_second * self.background_share
+                    )
+            self._condition.notify_all()
+        logger.info(
+            "Transfer governor: {} B/s, {} transfers, background share {}, shared dir {}",
+            self.bytes_per_second,
+            self.max_transfers,
+            self.background_share,
+            self.shared_dir,
+        )
+
+    def _make_bucket(self, name: str, rate: float) -> _TokenBucket | _SharedTokenBucket:
+        if self.shared_dir is not None:
+            return _SharedTokenBucket(self.shared_dir / name, rate)
+        return _TokenBucket(rate)
+
+    def _reserve(self, nbytes: int, priority: Priority) -> float:
+        with self._condition:
+            bucket, background_bucket = self._bucket, self._background_bucket
+        delay = bucket.reserve(nbytes) if bucket is not None else 0.0
+        if priority is Priority.BACKGROUND and background_bucket is not None:
+            delay = max(delay, background_bucket.reserve(nbytes))
+        return delay
+
+    def throttle(self, nbytes: int, priority: Priority = Priority.FOREGROUND) -> None:
+        """
+        Account the transferred bytes, sleeping if the bandwidth limit is exceeded.
+
+        Args:
+            nbytes: The number of transferred bytes.
+            priority: The priority class of the transfer.
+        """
+        if nbytes > 0 and (delay := self._reserve(nbytes, priority)):
+            time.sleep(delay)
+
+    async def athrottle(self, nbytes: int, priority: Priority = Priority.FOREGROUND) -> None:
+        """
+        Async version of `throttle` that does not block the event loop.
+
+        The host-shared bucket takes a blocking file lock, so it is reserved in a worker thread.
+
+        Args:
+            nbytes: The number of transferred bytes.
+            priority: The priority class of the transfer.
+        """
+        if nbytes <= 0:
+            return
+        if self.shared_dir is not None and self.bytes_per_second:
+            delay = await asyncio.to_thread(self._reserve, nbytes, priority)
+        else:
+            delay = self._reserve(nbytes, priority)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def _try_acquire(self, priority: Priority) -> tuple[bool, int | None]:
+        """
+        Try to take a transfer slot without waiting.
+
+        Returns:
+            tuple[bool, int | None]: Whether the slot is taken and the descriptor of the held host slot file.
+        """
+        with self._condition:
+            if self.max_transfers is None:
+                self._active += 1
+                return True, None
+            if self._active >= self.max_transfers:
+                return False, None
+            if priority is Priority.BACKGROUND and self._foreground_waiting:
+                return False, None
+
+            fd = None
+            if self.shared_dir is not None:
+                fd = self._try_lock_host_slot()
+                if fd is None:
+                    return False, None
+            self._active += 1
+            return True, fd
+
+    def _try_lock_host_slot(self) -> int | None:
+        assert self.shared_dir is not None and self.max_transfers is not None
+        for index in range(self.max_transfers):
+            fd = os.open(self.shared_dir / f"slot-{index}.lock", os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def _release(self, fd: int | None) -> None:
+        if fd is not None:
+            os.close(fd)
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def _mark_waiting(self, priority: Priority, waiting: bool) -> None:
+        with self._condition:
+            if priority is Priority.FOREGROUND:
+                self._foreground_waiting += 1 if waiting else -1
+                self._condition.notify_all()
+
+    @contextmanager
+    def transfer(self, priority: Priority = Priority.FOREGROUND) -> Iterator[None]:
+        """
+        Hold a transfer slot for the duration of the block, waiting for a free one.
+
+        Args:
+            priority: The priority class of the transfer.
+        """
+        acquired, fd = self._try_acquire(priority)
+        if not acquired:
+            self._mark_waiting(priority, waiting=True)
+            try:
+                while not acquired:
+                    with self._condition:
+                        self._condition.wait(_SLOT_POLL_INTERVAL)
+                    acquired, fd = self._try_acquire(priority)
+            finally:
+                self._mark_waiting(priority, waiting=False)
+        try:
+            yield
+        finally:
+            self._release(fd)
+
+    @asynccontextmanager
+    async def atransfer(self, priority: Priority = Priority.FOREGROUND) -> AsyncIterator[None]:
+        """
+        Async version of `transfer` that does not block the event loop.
+
+        Args:
+            priority: The priority class of the transfer.
+        """
+        acquired, fd = self._try_acquire(priority)
+        if not acquired:
+            self._mark_waiting(priority, waiting=True)
+            try:
+                while not acquired:
+                    await asyncio.sleep(_SLOT_POLL_INTERVAL)
+                    acquired, fd = self._try_acquire(priority)
+            finally:
+                self._mark_waiting(priority, waiting=False)
+        try:
+            yield
+        finally:
+            self._release(fd)
+
+
+governor: TransferGovernor = TransferGovernor(
+    bytes_per_second=settings.TRANSFER_MAX_BYTES_PER_SECOND,
+    max_transfers=settings.TRANSFER_MAX_CONCURRENT,
+    background_share=settings.TRANSFER_BACKGROUND_SHARE,
+    shared_dir=settings.TRANSFER_GOVERNOR_DIR,
+)
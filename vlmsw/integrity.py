@@ -0,0 +1,365 @@
+import base64
+import binascii
+import fcntl
+import hashlib
+import json
+import os
+import re
+import tempfile
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO
+
+from loguru import logger
+from pydantic import BaseModel
+
+from vlmsw.exceptions import IntegrityException
+
+MANIFEST_FILE_NAME = ".vlmsw-manifest.json"
+
+_ETAG_PATTERN = re.compile(r"^[0-9a-f]{32}(-\d+)?$")
+
+
+class StreamHasher:
+    """
+    Incrementally hashes a byte stream while it is being transferred.
+
+    Computes sha256 of the whole stream and md5 of every `part_size` part, so the S3 ETag
+    can be reproduced for both single-part and multipart objects without re-reading the file.
+    """
+
+    def __init__(self, part_size: int):
+        """
+        Initialize the StreamHasher object.
+
+        Args:
+            part_size: The size of the S3 part in bytes.
+        """
+        self.part_size = part_size
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._part_md5 = hashlib.md5()
+        self._part_filled = 0
+        self._part_digests: list[bytes] = []
+
+    def update(self, data: bytes) -> None:
+        """
+        Feed the next block of the stream to the hasher.
+
+        Args:
+            data: The block of bytes that directly follows the previously fed ones.
+        """
+        self._sha256.update(data)
+        self.size += len(data)
+        view = memoryview(data)
+        while view:
+            take = min(self.part_size - self._part_filled, len(view))
+            self._part_md5.update(view[:take])
+            self._part_filled += take
+            view = view[take:]
+            if self._part_filled == self.part_size:
+                self._part_digests.append(self._part_md5.digest())
+                self._part_md5 = hashlib.md5()
+                self._part_filled = 0
+
+    def part_digests(self) -> list[bytes]:
+        """
+        Returns:
+            list[bytes]: The md5 digests of all parts fed so far, including the incomplete last one.
+        """
+        digests = list(self._part_digests)
+        if self._part_filled or not digests:
+            digests.append(self._part_md5.digest())
+        return digests
+
+    def sha256(self) -> str:
+        """
+        Returns:
+            str: The hex sha256 digest of the whole stream.
+        """
+        return self._sha256.hexdigest()
+
+
+class HashingReader:
+    """
+    A read-only file wrapper that hashes the bytes as the consumer reads them.
+
+    Consumers such as boto3 may seek back and re-read a block (retries, checksum calculation),
+    so only bytes past the already hashed offset are fed to the hasher.
+    """
+
+    def __init__(self, fileobj: BinaryIO, hasher: StreamHasher):
+        """
+        Initialize the HashingReader object.
+
+        Args:
+            fileobj: The file object opened in binary mode.
+            hasher: The hasher receiving the stream.
+        """
+        self._fileobj = fileobj
+        self.hasher = hasher
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Read up to `size` bytes and hash the part of them that was not hashed yet.
+
+        Args:
+            size: The maximum number of bytes to read.
+        """
+        position = self._fileobj.tell()
+        data = self._fileobj.read(size)
+        end = position + len(data)
+        if position <= self.hasher.size < end:
+            self.hasher.update(data[self.hasher.size - position :])
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self._fileobj.seek(offset, whence)
+
+    def seekable(self) -> bool:
+        return self._fileobj.seekable()
+
+    def tell(self) -> int:
+        return self._fileobj.tell()
+
+    def close(self) -> None:
+        """
+        Does nothing: s3transfer closes the body after a single-part upload, while the file is still needed by
+        `finish()`. The owner of the file object closes it.
+        """
+
+    def finish(self) -> StreamHasher:
+        """
+        Hash the tail of the file the consumer did not read, if any.
+
+        Returns:
+            StreamHasher: The hasher with the whole file fed.
+        """
+        self._fileobj.seek(self.hasher.size)
+        while data := self._fileobj.read(1024 * 1024):
+            self.hasher.update(data)
+        return self.hasher
+
+
+def compose_etag(part_digests: list[bytes], multipart: bool) -> str:
+    """
+    Composes the S3 ETag from the md5 digests of the object parts.
+
+    Args:
+        part_digests (list[bytes]): The md5 digests of the parts in order.
+        multipart (bool): Whether the object was uploaded with the multipart upload.
+
+    Returns:
+        str: The ETag without quotes.
+    """
+    if not multipart:
+        return part_digests[0].hex()
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+def verify_etag(etag: str | None, part_digests: list[bytes], name: str) -> None:
+    """
+    Checks that the ETag returned by S3 matches the digests computed during the transfer.
+
+    ETags that are not md5 based (e.g. SSE-KMS encrypted objects) can not be verified and are skipped.
+
+    Args:
+        etag (str | None): The ETag returned by S3.
+        part_digests (list[bytes]): The md5 digests of the transferred parts in order.
+        name (str): The name of the transferred file, used in messages.
+
+    Raises:
+        IntegrityException: If the ETag does not match.
+    """
+    etag = (etag or "").strip('"')
+    if not _ETAG_PATTERN.match(etag):
+        logger.warning("ETag {!r} of {} is not md5 based: skip integrity check", etag, name)
+        return
+
+    expected = compose_etag(part_digests, multipart="-" in etag)
+    if etag != expected:
+        raise IntegrityException(f"ETag mismatch for {name}: expected {etag}, computed {expected}")
+
+
+def representation_sha256_from_headers(headers: Mapping[str, str]) -> str | None:
+    """
+    Extracts the sha256 digest of the representation from the `Repr-Digest`/`Digest` response headers.
+
+    Under RFC 9530 / RFC 3230 the digest covers the content-coded bytes, i.e. the bytes on the wire
+    before the `Content-Encoding` is removed.
+
+    Args:
+        headers (Mapping[str, str]): The response headers.
+
+    Returns:
+        str | None: The hex sha256 digest, or None if the server did not provide it.
+    """
+    for header in ("repr-digest", "digest"):
+        for item in headers.get(header, "").split(","):
+            algorithm, _, value = item.strip().partition("=")
+            if algorithm.lower() == "sha-256" and value:
+                try:
+                    return base64.b64decode(value.strip(":")).hex()
+                except binascii.Error:
+                    logger.warning("Malformed {} header: {}", header, item)
+    return None
+
+
+def checksum_sha256_from_headers(headers: Mapping[str, str]) -> str | None:
+    """
+    Extracts the sha256 digest of the file content from the `X-Checksum-Sha256` response header.
+
+    Args:
+        headers (Mapping[str, str]): The response headers.
+
+    Returns:
+        str | None: The hex sha256 digest, or None if the server did not provide it.
+    """
+    value = headers.get("x-checksum-sha256")
+    if value and re.fullmatch(r"[0-9a-fA-F]{64}", value):
+        return value.lower()
+    return None
+
+
+def verify_sha256(expected: str | None, computed: str, name: str) -> None:
+    """
+    Checks that the sha256 digest provided by the server matches the digest computed during the transfer.
+
+    Args:
+        expected (str | None): The hex sha256 digest provided by the server, or None if there is none.
+        computed (str): The hex sha256 digest computed during the transfer.
+        name (str): The name of the transferred file, used in messages.
+
+    Raises:
+        IntegrityException: If the digests do not match.
+    """
+    if expected is not None and expected != computed:
+        raise IntegrityException(f"sha256 mismatch for {name}: expected {expected}, computed {computed}")
+
+
+class ManifestEntry(BaseModel):
+    """
+    The digests of a file together with the file metadata at the time they were computed.
+    """
+
+    size: int
+    mtime_ns: int
+    sha256: str | None = None
+    etag: str | None = None
+
+
+class Manifest:
+    """
+    A local manifest storing digests of the transferred files of a directory.
+
+    The digests are computed during the transfer, so later cache validity checks compare only
+    the file metadata (size and mtime) and never re-hash the file. Updates are serialized with
+    a lock file, so threads and processes recording different files of the directory do not
+    overwrite each other's entries.
+    """
+
+    def __init__(self, directory: Path):
+        """
+        Initialize the Manifest object.
+
+        Args:
+            directory: The directory containing the files and the manifest.
+        """
+        self.path = directory / MANIFEST_FILE_NAME
+        self.entries = self._load()
+
+    def _load(self) -> dict[str, ManifestEntry]:
+        if not self.path.exists():
+            return {}
+        try:
+            raw_entries = json.loads(self.path.read_text())
+            return {name: ManifestEntry(**entry) for name, entry in raw_entries.items()}
+        except (ValueError, TypeError) as err:
+            logger.warning("Broken manifest {} is ignored: {}", self.path, err)
+            return {}
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        fd = os.open(self.path.with_name(f"{self.path.name}.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def record(self, file_path: Path, sha256: str | None = None, etag: str | None = None) -> ManifestEntry:
+        """
+        Records the digests of the file and saves the manifest, merging the entries recorded meanwhile by others.
+
+        Args:
+            file_path: The path to the file inside the manifest directory.
+            sha256: The hex sha256 digest of the file.
+            etag: The S3 ETag of the file.
+
+        Returns:
+            ManifestEntry: The recorded entry.
+        """
+        stat = file_path.stat()
+        entry = ManifestEntry(size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha256=sha256, etag=etag)
+        with self._locked():
+            self.entries = self._load()
+            self.entries[file_path.name] = entry
+            self._write()
+        return entry
+
+    def get_valid(self, file_path: Path) -> ManifestEntry | None:
+        """
+        Returns the manifest entry of the file if the file was not changed since it was recorded.
+
+        Args:
+            file_path: The path to the file inside the manifest directory.
+
+        Returns:
+            ManifestEntry | None: The entry, or None if the file is missing, unknown or changed.
+        """
+        entry = self.entries.get(file_path.name)
+        if entry is None:
+            return None
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            return None
+        if stat.st_size != entry.size or stat.st_mtime_ns != entry.mtime_ns:
+            return None
+        return entry
+
+    def is_valid(self, file_path: Path, etag: str | None = None, sha256: str | None = None) -> bool:
+        """
+        Checks by metadata only that the local file is an intact copy of the expected one.
+
+        Args:
+            file_path: The path to the file inside the manifest directory.
+            etag: The expected S3 ETag, if known.
+            sha256: The expected hex sha256 digest, if known.
+
+        Returns:
+            bool: True if the file can be used without downloading it again.
+        """
+        entry = self.get_valid(file_path)
+        if entry is None:
+            return False
+        if etag is not None and entry.etag != etag.strip('"'):
+            return False
+        if sha256 is not None and entry.sha256 != sha256:
+            return False
+        return True
+
+    def _write(self) -> None:
+        """
+        Atomically writes the manifest to disk. Must be called under the lock.
+        """
+        fd, tmp_name = tempfile.mkstemp(dir=self.path.parent, prefix=f"{self.path.name}.", suffix=".tmp")
+        try:
+            os.fchmod(fd, 0o644)
+            with os.fdopen(fd, "w") as fh:
+                json.dump({name: entry.model_dump() for name, entry in self.entries.items()}, fh, indent=2)
+            os.replace(tmp_name, self.path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
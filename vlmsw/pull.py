@@ -1,8 +1,24 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections.abc import AsyncIterator, Iterable
 from pathlib import Path
+from typing import Literal
 
 import httpx
+from loguru import logger
+from pydantic import BaseModel, TypeAdapter, ValidationError
 
+from vlmsw.compression import ZSTD_ENCODING, StreamDecompressor
 from vlmsw.exceptions import NotFoundModelException
+from vlmsw.governor import Priority, governor
+from vlmsw.integrity import (
+    Manifest,
+    checksum_sha256_from_headers,
+    representation_sha256_from_headers,
+    verify_sha256,
+)
 from vlmsw.settings.settings import settings
 
 
@@ -24,6 +40,217 @@ async def get_all_models_with_versions() -> dict[str, list[str]]:
         return  response.json()
 
 
+class ModelEvent(BaseModel):
+    """
+    A change in the model registry.
+    """
+
+    type: Literal["new_version", "new_converted_file"]
+    model: str
+    version: str
+    file_name: str | None = None
+
+
+_CATALOG_ADAPTER = TypeAdapter(dict[str, list[str]])
+
+
+async def _watch_server_events(client: httpx.AsyncClient, models: set[str] | None) -> AsyncIterator[ModelEvent]:
+    """
+    Yields the change events pushed by the service as server-sent events, reconnecting on network errors.
+
+    Returns as soon as the service turns out not to support the event stream, or when it can not be
+    reached `WATCH_EVENTS_MAX_FAILURES` times in a row.
+
+    :param client: The HTTP client used to make the request.
+    :param models: The names of the watched models, None to watch all models.
+    :return: An async iterator of the change events.
+    """
+    events_endpoint = settings.MODEL_STORAGE_EVENTS_ENDPOINT
+    if not events_endpoint:
+        return
+
+    last_event_id = None
+    failures = 0
+    while True:
+        headers = {"Accept": "text/event-stream"}
+        if last_event_id:
+            headers["Last-Event-ID"] = last_event_id
+        try:
+            async with client.stream(
+                "GET", events_endpoint, headers=headers, timeout=httpx.Timeout(10, read=None)
+            ) as response:
+                if response.status_code != 200 or not response.headers.get("content-type", "").startswith(
+                    "text/event-stream"
+                ):
+                    logger.info("Service does not stream events ({}): fall back to polling", response.status_code)
+                    return
+
+                failures = 0
+                data_lines: list[str] = []
+                async for line in response.aiter_lines():
+                    if line.startswith("id:"):
+                        last_event_id = line[3:].strip()
+                    elif line.startswith("data:"):
+                        data_lines.append(line[5:].strip())
+                    elif not line and data_lines:
+                        try:
+                            event = ModelEvent.model_validate_json("\n".join(data_lines))
+                        except ValidationError as err:
+                            logger.warning("Unknown event is skipped: {}", err)
+                        else:
+                            if models is None or event.model in models:
+                                yield event
+                        data_lines = []
+        except httpx.HTTPError as err:
+            failures += 1
+            if failures >= settings.WATCH_EVENTS_MAX_FAILURES:
+                logger.warning("Event stream is unavailable ({}): fall back to polling", err)
+                return
+            logger.warning("Event stream interrupted, reconnecting: {}", err)
+        await asyncio.sleep(settings.WATCH_POLL_INTERVAL)
+
+
+async def _poll_new_versions(client: httpx.AsyncClient, models: set[str] | None) -> AsyncIterator[ModelEvent]:
+    """
+    Polls the registry with ETag-conditional requests and yields the versions that were not seen before.
+
+    While the registry does not change, the service answers 304 with no body, so a tick costs one round-trip.
+    The `Prefer: wait` header lets a service supporting long-poll hold the request until a change.
+    The first response only establishes the baseline and yields nothing.
+
+    :param client: The HTTP client used to make the request.
+    :param models: The names of the watched models, None to watch all models.
+    :return: An async iterator of the change events.
+    """
+    etag = None
+    content = None
+    known: dict[str, set[str]] | None = None
+    while True:
+        started = time.monotonic()
+        headers = {"Prefer": f"wait={settings.WATCH_LONG_POLL_TIMEOUT}"}
+        if etag:
+            headers["If-None-Match"] = etag
+        try:
+            response = await client.get(
+                settings.MODEL_STORAGE_ENDPOINT, headers=headers, timeout=settings.WATCH_LONG_POLL_TIMEOUT + 10
+            )
+        except httpx.HTTPError as err:
+            logger.warning("Registry polling failed: {}", err)
+        else:
+            if response.status_code == 200:
+                etag = response.headers.get("etag")
+                # сравниваем каталог, только если он действительно изменился
+                if response.content != content:
+                    try:
+                        catalog = _CATALOG_ADAPTER.validate_json(response.content)
+                    except ValidationError as err:
+                        logger.warning("Registry returned a malformed catalog: {}", err)
+                    else:
+                        content = response.content
+                        if models is not None:
+                            catalog = {model: catalog.get(model, []) for model in models}
+                        if known is not None:
+                            for model, versions in catalog.items():
+                                model_known = known.get(model, set())
+                                for version in versions:
+                                    if version not in model_known:
+                                        yield ModelEvent(type="new_version", model=model, version=version)
+                        known = {model: set(versions) for model, versions in catalog.items()}
+            elif response.status_code != 304:
+                logger.warning("Registry polling failed: {} {}", response.status_code, response.text)
+        await asyncio.sleep(max(0.0, settings.WATCH_POLL_INTERVAL - (time.monotonic() - started)))
+
+
+async def watch(models: Iterable[str] | None = None) -> AsyncIterator[ModelEvent]:
+    """
+    Watches the registry and yields only the changes: new versions and new converted files.
+
+    Uses the server-sent events stream of the service if `MODEL_STORAGE_EVENTS_ENDPOINT` is configured and
+    supported, otherwise falls back to ETag-conditional polling of the registry with a client-side diff.
+    In the polling mode only new versions are reported.
+
+    :param models: The names of the watched models. If None, all models are watched.
+    :return: An async iterator of the change events.
+    """
+    watched = set(models) if models is not None else None
+    async with httpx.AsyncClient() as client:
+        if settings.MODEL_STORAGE_EVENTS_ENDPOINT:
+            async for event in _watch_server_events(client, watched):
+                yield event
+        async for event in _poll_new_versions(client, watched):
+            yield event
+
+
+async def download_file(
+    client: httpx.AsyncClient, url: str, destination: Path, priority: Priority = Priority.FOREGROUND
+) -> Path:
+    """
+    Streams a file from the service to the destination path, computing its sha256 on the fly.
+
+    The digests provided by the server are checked: `Repr-Digest`/`Digest` against the bytes as transferred
+    (still zstd encoded, if so), `X-Checksum-Sha256` against the decoded file. The sha256 of the decoded file
+    is stored in the local manifest. If the manifest shows an unchanged local copy, the request is made
+    conditional on its ETag and the body is not transferred again.
+    zstd transport compression is negotiated with `Accept-Encoding`; decompression runs in a worker thread
+    so it does not block the other transfers of the event loop.
+
+    :param client: The HTTP client used to make the request.
+    :param url: The URL of the file.
+    :param destination: The path where the file will be stored.
+    :param priority: The priority class of the transfer for the transfer governor.
+    :return: The path to the downloaded file.
+    :raises NotFoundModelException: If the service does not return the file.
+    :raises IntegrityException: If the downloaded bytes do not match the digest provided by the server
+        or the zstd stream is truncated.
+    """
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(destination.parent)
+    headers = {"Accept-Encoding": f"{ZSTD_ENCODING}, identity" if settings.COMPRESSION_ENABLED else "identity"}
+    entry = manifest.get_valid(destination)
+    if entry is not None and entry.etag:
+        headers["If-None-Match"] = f'"{entry.etag}"'
+
+    async with governor.atransfer(priority), client.stream("GET", url, headers=headers) as response:
+        if response.status_code == 304:
+            return destination
+        if response.status_code != 200:
+            await response.aread()
+            raise NotFoundModelException(str(response.json()['detail']))
+
+        sha256 = hashlib.sha256()
+        tmp_path = destination.with_name(f"{destination.name}.part")
+        try:
+            zstd_encoded = response.headers.get("content-encoding") == ZSTD_ENCODING
+            decompressor = StreamDecompressor() if zstd_encoded else None
+            # Repr-Digest и Digest описывают байты с учетом Content-Encoding, а не разжатый файл
+            wire_sha256 = hashlib.sha256() if zstd_encoded else sha256
+            if zstd_encoded:
+                chunks = response.aiter_raw(settings.TRANSFER_CHUNK_SIZE)
+            else:
+                chunks = response.aiter_bytes(settings.TRANSFER_CHUNK_SIZE)
+            with open(tmp_path, "wb") as fh:
+                async for chunk in chunks:
+                    await governor.athrottle(len(chunk), priority)
+                    if decompressor is not None:
+                        wire_sha256.update(chunk)
+                        chunk = await asyncio.to_thread(decompressor.decompress, chunk)
+                    fh.write(chunk)
+                    sha256.update(chunk)
+            if decompressor is not None:
+                decompressor.finish(destination.name)
+            verify_sha256(
+                representation_sha256_from_headers(response.headers), wire_sha256.hexdigest(), destination.name
+            )
+            verify_sha256(checksum_sha256_from_headers(response.headers), sha256.hexdigest(), destination.name)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    os.replace(tmp_path, destination)
+    manifest.record(destination, sha256=sha256.hexdigest(), etag=response.headers.get("etag", "").strip('"') or None)
+    return destination
+
+
 def fetch_model_version_files(model: str, version: str, client: httpx.Client) -> list[str]:
     """
     Fetches the list of available files for a specific model version.
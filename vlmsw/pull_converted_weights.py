@@ -0,0 +1,298 @@
+import hashlib
+import json
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from botocore.exceptions import ClientError
+from loguru import logger
+
+from vlmsw.common import get_s3_client
+from vlmsw.compression import ZSTD_ENCODING, ZSTD_SUFFIX, StreamDecompressor
+from vlmsw.exceptions import IntegrityException
+from vlmsw.governor import Priority, governor
+from vlmsw.integrity import Manifest, StreamHasher, verify_etag
+from vlmsw.settings.settings import settings
+
+
+def _download_part(
+    s3_client: Any, bucket_name: str, key: str, start: int, end: int, fd: int, priority: Priority
+) -> StreamHasher:
+    """
+    Downloads the byte range of the S3 object into the file, hashing the bytes as they arrive.
+
+    Args:
+        s3_client: The boto3 S3 client.
+        bucket_name (str): The name of the S3 bucket.
+        key (str): The key of the object.
+        start (int): The first byte of the range.
+        end (int): The last byte of the range (inclusive).
+        fd (int): The descriptor of the file opened for writing.
+        priority (Priority): The priority class of the transfer for the transfer governor.
+
+    Returns:
+        StreamHasher: The hasher fed with the bytes of the range.
+    """
+    hasher = StreamHasher(max(end - start + 1, 1))
+    get_kwargs = {"Range": f"bytes={start}-{end}"} if end >= start else {}
+    response = s3_client.get_object(Bucket=bucket_name, Key=key, **get_kwargs)
+
+    offset = start
+    for chunk in response["Body"].iter_chunks(settings.TRANSFER_CHUNK_SIZE):
+        os.pwrite(fd, chunk, offset)
+        offset += len(chunk)
+        hasher.update(chunk)
+        governor.throttle(len(chunk), priority)
+
+    if offset != end + 1:
+        raise IntegrityException(f"Truncated range {start}-{end} of {key}: got {offset - start} bytes")
+    return hasher
+
+
+def _download_compressed(
+    s3_client: Any, bucket_name: str, key: str, part_size: int, tmp_path: Path, priority: Priority
+) -> tuple[StreamHasher, str]:
+    """
+    Streams the zstd compressed S3 object into the file, decompressing and hashing the bytes as they arrive.
+
+    Args:
+        s3_client: The boto3 S3 client.
+        bucket_name (str): The name of the S3 bucket.
+        key (str): The key of the object.
+        part_size (int): The size of the S3 part of the object.
+        tmp_path (Path): The path to the file for the decompressed bytes.
+        priority (Priority): The priority class of the transfer for the transfer governor.
+
+    Returns:
+        tuple[StreamHasher, str]: The hasher fed with the compressed bytes and the hex sha256 digest of
+        the decompressed ones.
+
+    Raises:
+        IntegrityException: If the zstd stream is truncated.
+    """
+    hasher = StreamHasher(part_size)
+    sha256 = hashlib.sha256()
+    decompressor = StreamDecompressor()
+    response = s3_client.get_object(Bucket=bucket_name, Key=key)
+    with open(tmp_path, "wb") as fh:
+        for chunk in response["Body"].iter_chunks(settings.TRANSFER_CHUNK_SIZE):
+            hasher.update(chunk)
+            governor.throttle(len(chunk), priority)
+            data = decompressor.decompress(chunk)
+            fh.write(data)
+            sha256.update(data)
+    decompressor.finish(key)
+    return hasher, sha256.hexdigest()
+
+
+def _head_weights_object(s3_client: Any, bucket_name: str, key: str) -> tuple[str, dict[str, Any]]:
+    """
+    Finds the weights object, stored as is under the key or zstd compressed under the key with the ".zst" suffix.
+
+    Args:
+        s3_client: The boto3 S3 client.
+        bucket_name (str): The name of the S3 bucket.
+        key (str): The key of the weights file.
+
+    Returns:
+        tuple[str, dict[str, Any]]: The key of the found object and its HeadObject response.
+
+    Raises:
+        ClientError: If neither object exists.
+    """
+    try:
+        return key, s3_client.head_object(Bucket=bucket_name, Key=key)
+    except ClientError as err:
+        if err.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+            raise
+    compressed_key = f"{key}{ZSTD_SUFFIX}"
+    return compressed_key, s3_client.head_object(Bucket=bucket_name, Key=compressed_key)
+
+
+def _pull_from_cache_daemon(
+    weights_name: str, model_name: str, model_version: str, bucket_name: str, save_to: Path
+) -> Path | None:
+    """
+    Gets the weights file from the cache daemon of the host.
+
+    The daemon answers with the path of the file in its store and passes the open file descriptor along.
+    The file is hardlinked from the store if the path points to the same file as the descriptor, or copied in
+    the kernel from the descriptor if the store is on another filesystem or not visible from the container.
+
+    Args:
+        weights_name (str): The name of the weights file.
+        model_name (str): The name of the model.
+        model_version (str): The version of the model.
+        bucket_name (str): The name of the S3 bucket.
+        save_to (Path): The directory where the weights file will be stored.
+
+    Returns:
+        Path | None: The path to the weights file, or None if the daemon is not available or fails.
+    """
+    socket_path = settings.CACHE_DAEMON_SOCKET
+    if not socket_path or not Path(socket_path).exists() or bucket_name != settings.artifacts_converted_bucket:
+        return None
+
+    request = {
+        "weights_name": weights_name,
+        "model_name": model_name,
+        "model_version": model_version,
+        "bucket_name": bucket_name,
+    }
+    fds: list[int] = []
+    tmp_path = None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(settings.CACHE_DAEMON_TIMEOUT)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            message, fds, _, _ = socket.recv_fds(sock, 4096, 1)
+            while message and not message.endswith(b"\n"):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                message += chunk
+
+        response = json.loads(message)
+        if "error" in response or not fds:
+            logger.warning("Cache daemon failed to pull {}, pull directly: {}", weights_name, response.get("error"))
+            return None
+
+        save_to.mkdir(parents=True, exist_ok=True)
+        destination = save_to / weights_name
+        tmp_path = destination.with_name(f"{destination.name}.part")
+        tmp_path.unlink(missing_ok=True)
+        try:
+            # путь дан в пространстве имен демона: в контейнере он может вести к другому или устаревшему файлу,
+            # поэтому ссылка создается, только если путь указывает на тот же файл, что и переданный дескриптор
+            store_fd_stat = os.fstat(fds[0])
+            store_stat = os.stat(response["path"])
+            if (store_stat.st_dev, store_stat.st_ino) != (store_fd_stat.st_dev, store_fd_stat.st_ino):
+                raise OSError(f"{response['path']} is not the file passed by the cache daemon")
+            os.link(response["path"], tmp_path)
+        except OSError:
+            with open(tmp_path, "wb") as fh:
+                offset = 0
+                while sent := os.sendfile(fh.fileno(), fds[0], offset, response["size"] - offset):
+                    offset += sent
+            if offset != response["size"]:
+                raise IntegrityException(f"Truncated copy of {weights_name}: got {offset} of {response['size']} bytes")
+        os.replace(tmp_path, destination)
+        Manifest(save_to).record(destination, sha256=response.get("sha256"), etag=response.get("etag"))
+    except Exception as err:  # pylint: disable=broad-exception-caught
+        # демон - только ускорение: при любой ошибке файл скачивается напрямую
+        logger.warning("Cache daemon {} failed to provide {}, pull directly: {}", socket_path, weights_name, err)
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+        return None
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+    logger.info("Converted weights {} are taken from the cache daemon", destination)
+    return destination
+
+
+def download_weights_file(
+    weights_name: str,
+    model_name: str,
+    model_version: str,
+    bucket_name: str,
+    save_to: Path,
+    priority: Priority = Priority.FOREGROUND,
+    use_cache_daemon: bool = True,
+) -> Path:
+    """
+    Downloads a converted weights file of the specified model name and version from the S3 bucket.
+
+    Multipart objects are downloaded in parallel by ranges aligned to the uploaded parts, so the md5 of
+    each part is combined into the ETag and checked against S3 without a separate hashing pass.
+    Single-part objects are streamed sequentially and their sha256 is also recorded.
+    Objects stored zstd compressed under the key with the ".zst" suffix are read with a single sequential
+    request and decompressed while streaming, the ETag is checked against the compressed bytes.
+    If the manifest shows an unchanged local copy with the same ETag, the download is skipped.
+    If the cache daemon of the host is running, the file is taken from its store instead.
+
+    Args:
+        weights_name (str): The name of the weights file.
+        model_name (str): The name of the model.
+        model_version (str): The version of the model.
+        bucket_name (str): The name of the S3 bucket.
+        save_to (Path): The directory where the weights file will be stored.
+        priority (Priority): The priority class of the transfer for the transfer governor.
+        use_cache_daemon (bool): Whether to ask the cache daemon of the host first.
+
+    Returns:
+        Path: The path to the downloaded weights file.
+
+    Raises:
+        IntegrityException: If the downloaded bytes do not match the ETag of the object.
+    """
+    if use_cache_daemon and (
+        path := _pull_from_cache_daemon(weights_name, model_name, model_version, bucket_name, save_to)
+    ):
+        return path
+
+    s3_client = get_s3_client()
+    key = f"{model_name}/{model_version}/{weights_name}"
+    save_to.mkdir(parents=True, exist_ok=True)
+    destination = save_to / weights_name
+    manifest = Manifest(save_to)
+
+    key, head = _head_weights_object(s3_client, bucket_name, key)
+    etag = head["ETag"].strip('"')
+    if manifest.is_valid(destination, etag=etag):
+        logger.info("Converted weights {} are up to date: skip download", destination)
+        return destination
+
+    size = head["ContentLength"]
+    part_size = max(size, 1)
+    if "-" in etag:
+        # размер части multipart upload, чтобы диапазоны совпадали с частями ETag
+        part_size = s3_client.head_object(Bucket=bucket_name, Key=key, PartNumber=1)["ContentLength"]
+
+    logger.info("Download converted weights for model {}, version {}: Start", model_name, model_version)
+    tmp_path = destination.with_name(f"{destination.name}.part")
+    sha256: str | None
+    if key.endswith(ZSTD_SUFFIX) or head.get("ContentEncoding") == ZSTD_ENCODING:
+        # zstd поток разжимается по порядку, поэтому объект читается одним запросом без второго прохода
+        try:
+            with governor.transfer(priority):
+                hasher, sha256 = _download_compressed(s3_client, bucket_name, key, part_size, tmp_path, priority)
+            if hasher.size != size:
+                raise IntegrityException(f"Truncated object {key}: got {hasher.size} of {size} bytes")
+            verify_etag(etag, hasher.part_digests(), key)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+    else:
+        ranges = [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)] or [(0, -1)]
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            with (
+                governor.transfer(priority),
+                ThreadPoolExecutor(max_workers=min(settings.TRANSFER_MAX_WORKERS, len(ranges))) as executor,
+            ):
+                hashers = list(
+                    executor.map(
+                        lambda part: _download_part(s3_client, bucket_name, key, part[0], part[1], fd, priority),
+                        ranges,
+                    )
+                )
+            verify_etag(etag, [hasher.part_digests()[0] for hasher in hashers], key)
+        except BaseException:
+            os.close(fd)
+            tmp_path.unlink(missing_ok=True)
+            raise
+        os.close(fd)
+        sha256 = hashers[0].sha256() if len(hashers) == 1 else None
+
+    os.replace(tmp_path, destination)
+    manifest.record(destination, sha256=sha256, etag=etag)
+    logger.success(
+        "Download converted weights for model {}, version {}: Сompleted Successfully", model_name, model_version
+    )
+    return destination
@@ -1,15 +1,26 @@
 from pathlib import Path
+from typing import BinaryIO, cast
 
 import boto3
-from boto3.s3.transfer import S3Transfer
+from boto3.s3.transfer import TransferConfig
 from loguru import logger
+from s3transfer.utils import ChunksizeAdjuster
 from vlmrs.schema import BaseModelSchema
 
-from vlmlflow.common import extract_file_info
-from vlmlflow.settings.settings import settings
+from vlmsw.common import extract_file_info, get_s3_client
+from vlmsw.compression import ZSTD_SUFFIX, get_compressor, is_compressible
+from vlmsw.governor import Priority, governor
+from vlmsw.integrity import HashingReader, Manifest, StreamHasher, verify_etag
+from vlmsw.settings.settings import settings
 
 
-def upload_weights_file(weights_path: Path, model_name: str, model_version: str, bucket_name: str) -> bool:
+def upload_weights_file(
+    weights_path: Path,
+    model_name: str,
+    model_version: str,
+    bucket_name: str,
+    priority: Priority = Priority.FOREGROUND,
+) -> bool:
     """
     Uploads a converted weights file to the specified model name and version in the "mlflow-artifacts-converted" S3 bucket.
 
@@ -18,23 +29,69 @@ def upload_weights_file(weights_path: Path, model_name: str, model_version: str,
         model_name (str): The name of the model.
         model_version (str): The version of the model.
         bucket_name (str): The name of the S3 bucket.
+        priority (Priority): The priority class of the transfer for the transfer governor.
 
     Returns:
         bool True if the file was uploaded successfully, False otherwise.
 
+    Raises:
+        IntegrityException: If the ETag of the uploaded object does not match the uploaded bytes.
+
     Side Effects:
         Uploads the weights file to the specified model name and version in the "mlflow-artifacts-converted" S3 bucket.
+        Records the digests of the weights file in the manifest of its directory, if the directory is writable.
+        If `COMPRESSION_AT_REST` is enabled, compressible files are stored zstd compressed under the key with
+        the ".zst" suffix. The copy of the file stored under the other key is removed.
 
     """
-    s3_client = boto3.client("s3", endpoint_url=settings.mlflow_s3_endpoint_url)
-
-    logger.info("Upload converted weights for model {}, version {}: Start", model_name, model_version)
-    transfer = S3Transfer(s3_client)
-    transfer.upload_file(
-        str(weights_path),
-        bucket_name,
-        f"{model_name}/{model_version}/{weights_path.name}",
+    s3_client = get_s3_client()
+    key = f"{model_name}/{model_version}/{weights_path.name}"
+
+    # хешируем файл по частям так же, как boto3 разбивает его при multipart upload,
+    # чтобы сверить ETag без повторного чтения файла
+    config = TransferConfig()
+    size = weights_path.stat().st_size
+    if size >= config.multipart_threshold:
+        part_size = ChunksizeAdjuster().adjust_chunksize(config.multipart_chunksize, size)
+    else:
+        part_size = max(size, 1)
+
+    compress = settings.COMPRESSION_AT_REST and is_compressible(weights_path)
+    # сжатые объекты хранятся под отдельным ключом, чтобы их не получили версии без поддержки сжатия
+    key, stale_key = (f"{key}{ZSTD_SUFFIX}", key) if compress else (key, f"{key}{ZSTD_SUFFIX}")
+    logger.info(
+        "Upload converted weights for model {}, version {}: Start (compressed: {})",
+        model_name,
+        model_version,
+        compress,
     )
+    with governor.transfer(priority), open(weights_path, "rb") as fh:
+        reader = HashingReader(fh, StreamHasher(part_size))
+        body, extra_args = reader, {}
+        if compress:
+            # размер сжатого потока заранее неизвестен, boto3 режет его на части по multipart_chunksize
+            compressed = get_compressor().stream_reader(cast(BinaryIO, reader))
+            body = HashingReader(cast(BinaryIO, compressed), StreamHasher(config.multipart_chunksize))
+            extra_args = {"ContentType": "application/zstd"}
+        s3_client.upload_fileobj(
+            body,
+            bucket_name,
+            key,
+            ExtraArgs=extra_args,
+            Config=config,
+            Callback=lambda nbytes: governor.throttle(nbytes, priority),
+        )
+        hasher = reader.finish()
+
+    etag = s3_client.head_object(Bucket=bucket_name, Key=key)["ETag"].strip('"')
+    verify_etag(etag, body.hasher.part_digests(), key)
+    # копия под другим ключом устарела, а несжатая к тому же перекрыла бы при чтении новую сжатую
+    s3_client.delete_object(Bucket=bucket_name, Key=stale_key)
+    try:
+        Manifest(weights_path.parent).record(weights_path, sha256=hasher.sha256(), etag=etag)
+    except OSError as err:
+        # манифест только ускоряет повторные проверки, загрузка уже завершена
+        logger.warning("Manifest of {} is not updated: {}", weights_path.parent, err)
     logger.success(
         "Upload converted weights for model {}, version {}: Сompleted Successfully", model_name, model_version
     )
@@ -0,0 +1,217 @@
+import re
+from collections.abc import Iterable
+from pathlib import PurePosixPath
+
+from loguru import logger
+from pydantic import BaseModel
+from vlmrs.schema import BaseModelSchema
+
+from vlmsw.common import get_s3_client
+from vlmsw.compression import ZSTD_SUFFIX
+from vlmsw.exceptions import NotFoundModelException
+from vlmsw.settings.settings import settings
+
+# теги среды выполнения в имени сконвертированных весов, например yolov5_cuda11.7_trt8.4.3_cc8.6.engine
+_TAG_PATTERNS = {
+    "cuda_version": re.compile(r"(?:^|[_\-.])cuda[_\-]?(\d+(?:\.\d+)*)", re.IGNORECASE),
+    "trt_version": re.compile(r"(?:^|[_\-.])(?:trt|tensorrt)[_\-]?(\d+(?:\.\d+)*)", re.IGNORECASE),
+    "compute_capability": re.compile(r"(?:^|[_\-.])(?:cc|sm)[_\-]?(\d+(?:\.\d+)?)", re.IGNORECASE),
+    "onnx_version": re.compile(r"(?:^|[_\-.])onnx[_\-]?(\d+(?:\.\d+)*)", re.IGNORECASE),
+}
+_TRT_SUFFIXES = {".engine", ".trt", ".plan"}
+_ONNX_SUFFIXES = {".onnx"}
+
+
+def _version_key(version: str) -> tuple[int, ...]:
+    # учитываются только начальные числовые компоненты: 1.17.0rc1 -> (1, 17, 0)
+    match = re.match(r"\d+(?:\.\d+)*", version.strip())
+    return tuple(int(part) for part in match.group().split(".")) if match else ()
+
+
+def _normalize_compute_capability(value: str) -> str:
+    # sm86, sm_86, cc8.6 и 8.6 обозначают одно и то же
+    value = re.sub(r"^(?:cc|sm)[_\-]?", "", value.strip(), flags=re.IGNORECASE)
+    if "." not in value and len(value) >= 2:
+        return f"{value[:-1]}.{value[-1]}"
+    return value
+
+
+class RuntimeTags(BaseModel):
+    """
+    Versions of the runtime a converted weights file is built for or is going to be run on.
+    """
+
+    cuda_version: str | None = None
+    trt_version: str | None = None
+    compute_capability: str | None = None
+    onnx_version: str | None = None
+
+    @classmethod
+    def from_file_name(cls, file_name: str) -> "RuntimeTags":
+        """
+        Parses the runtime tags from the name of a converted weights file.
+
+        Args:
+            file_name (str): The name of the converted weights file.
+
+        Returns:
+            RuntimeTags: The tags found in the name, missing ones are None.
+        """
+        tags = {
+            name: match.group(1) for name, pattern in _TAG_PATTERNS.items() if (match := pattern.search(file_name))
+        }
+        if "compute_capability" in tags:
+            tags["compute_capability"] = _normalize_compute_capability(tags["compute_capability"])
+        return cls(**tags)
+
+    @classmethod
+    def from_schema(cls, model_schema: BaseModelSchema) -> "RuntimeTags":
+        """
+        Takes the runtime versions from the model schema.
+
+        Args:
+            model_schema (BaseModelSchema): The schema of the model.
+
+        Returns:
+            RuntimeTags: The runtime versions of the schema.
+        """
+        return cls(
+            cuda_version=model_schema.cuda_version,
+            trt_version=model_schema.trt_version,
+            compute_capability=model_schema.compute_capability,
+            onnx_version=model_schema.onnx_version,
+        )
+
+
+class ConvertedWeightsIndex:
+    """
+    An in-memory index of the converted weights files of a model version by their runtime tags.
+
+    TensorRT engines are compatible only with the same compute capability, with a TensorRT version matching
+    the components present in the file tag (trt8.4.3 matches 8.4.3 and 8.4.3.1) and with a CUDA version of
+    the same major not newer than the runtime one. ONNX files are compatible with
+    a runtime of the same or newer ONNX version. Among compatible files the one built for the newest
+    CUDA/ONNX version is the best.
+    """
+
+    def __init__(self, file_names: Iterable[str]):
+        """
+        Initialize the ConvertedWeightsIndex object.
+
+        Args:
+            file_names: The names of the converted weights files of the model version.
+        """
+        self.file_names = list(file_names)
+        self._trt: dict[str, list[tuple[tuple[int, ...], tuple[int, ...], str]]] = {}
+        self._onnx: list[tuple[tuple[int, ...], str]] = []
+
+        for file_name in self.file_names:
+            suffix = PurePosixPath(file_name).suffix.lower()
+            tags = RuntimeTags.from_file_name(file_name)
+            if suffix in _TRT_SUFFIXES and tags.trt_version and tags.compute_capability and tags.cuda_version:
+                self._trt.setdefault(tags.compute_capability, []).append(
+                    (_version_key(tags.cuda_version), _version_key(tags.trt_version), file_name)
+                )
+            elif suffix in _ONNX_SUFFIXES:
+                self._onnx.append((_version_key(tags.onnx_version) if tags.onnx_version else (), file_name))
+
+        for candidates in self._trt.values():
+            candidates.sort(reverse=True)
+        self._onnx.sort(reverse=True)
+
+    @classmethod
+    def from_s3(cls, model_name: str, model_version: str, bucket_name: str | None = None) -> "ConvertedWeightsIndex":
+        """
+        Builds the index from a single listing of the converted weights of the model version in the S3 bucket.
+
+        Args:
+            model_name (str): The name of the model.
+            model_version (str): The version of the model.
+            bucket_name (str | None): The name of the S3 bucket, the converted artifacts bucket by default.
+
+        Returns:
+            ConvertedWeightsIndex: The index of the converted weights files.
+        """
+        s3_client = get_s3_client()
+        prefix = f"{model_name}/{model_version}/"
+        list_kwargs = {"Bucket": bucket_name or settings.artifacts_converted_bucket, "Prefix": prefix}
+
+        file_names: list[str] = []
+        while True:
+            response = s3_client.list_objects_v2(**list_kwargs)
+            # сжатые веса хранятся под именем с суффиксом .zst
+            file_names.extend(
+                obj["Key"][len(prefix) :].removesuffix(ZSTD_SUFFIX) for obj in response.get("Contents", [])
+            )
+            if not response.get("IsTruncated"):
+                break
+            list_kwargs["ContinuationToken"] = response["NextContinuationToken"]
+        return cls(dict.fromkeys(file_names))
+
+    def resolve_trt(self, runtime: RuntimeTags) -> str | None:
+        """
+        Finds the best TensorRT engine for the runtime.
+
+        The TensorRT version is matched on the components present in the file tag, so an engine tagged
+        trt8.4.3 is found for the 8.4.3.1 runtime.
+
+        Args:
+            runtime (RuntimeTags): The runtime versions, cuda_version, trt_version and compute_capability are required.
+
+        Returns:
+            str | None: The name of the engine file, or None if there is no compatible one.
+        """
+        if not (runtime.cuda_version and runtime.trt_version and runtime.compute_capability):
+            return None
+        cuda = _version_key(runtime.cuda_version)
+        trt = _version_key(runtime.trt_version)
+        compute_capability = _normalize_compute_capability(runtime.compute_capability)
+        for file_cuda, file_trt, file_name in self._trt.get(compute_capability, []):
+            if file_trt == trt[: len(file_trt)] and file_cuda[:1] == cuda[:1] and file_cuda <= cuda:
+                return file_name
+        return None
+
+    def resolve_onnx(self, runtime: RuntimeTags) -> str | None:
+        """
+        Finds the best ONNX file for the runtime.
+
+        Args:
+            runtime (RuntimeTags): The runtime versions. If onnx_version is None, any ONNX file is compatible.
+
+        Returns:
+            str | None: The name of the ONNX file, or None if there is no compatible one.
+        """
+        onnx = _version_key(runtime.onnx_version) if runtime.onnx_version else None
+        for file_onnx, file_name in self._onnx:
+            if onnx is None or file_onnx <= onnx:
+                return file_name
+        return None
+
+
+def resolve_converted_weights(
+    model_name: str, model_version: str, runtime: RuntimeTags, weights_type: str = "trt"
+) -> str:
+    """
+    Finds the best converted weights file of the model version for the runtime with a single S3 listing.
+
+    Args:
+        model_name (str): The name of the model.
+        model_version (str): The version of the model.
+        runtime (RuntimeTags): The versions of the current runtime.
+        weights_type (str): The type of the converted weights, "trt" or "onnx".
+
+    Returns:
+        str: The name of the converted weights file.
+
+    Raises:
+        NotFoundModelException: If there is no compatible converted weights file.
+    """
+    index = ConvertedWeightsIndex.from_s3(model_name, model_version)
+    file_name = index.resolve_trt(runtime) if weights_type == "trt" else index.resolve_onnx(runtime)
+    if file_name is None:
+        raise NotFoundModelException(
+            f"No {weights_type} weights of model {model_name}, version {model_version} compatible with {runtime}; "
+            f"available: {index.file_names}"
+        )
+    logger.info("Resolved converted weights for model {}, version {}: {}", model_name, model_version, file_name)
+    return file_name
@@ -10,7 +10,51 @@ class Settings(BaseSettings):
     """Settings"""
 
     MODEL_STORAGE_ENDPOINT: str = "http://localhost:6529/model_versions/get_file/3"
+    # поток server-sent events об изменениях реестра, None - только опрос реестра
+    MODEL_STORAGE_EVENTS_ENDPOINT: str | None = None
+    WATCH_POLL_INTERVAL: float = 5.0
+    WATCH_LONG_POLL_TIMEOUT: int = 30
+    # число неудачных подключений к потоку событий подряд до перехода на опрос реестра
+    WATCH_EVENTS_MAX_FAILURES: int = 3
 
+    # имена совпадают с атрибутами, которые используют common.py, push.py и тесты
+    mlflow_url: str = "http://localhost:5000"
+    mlflow_s3_endpoint_url: str | None = None
+    mlflow_default_bucket: str = "mlflow"
+    aws_default_region: str = "us-east-1"
+    artifacts_converted_bucket: str = "mlflow-artifacts-converted"
+
+    # размер блока при потоковом чтении/записи файлов
+    TRANSFER_CHUNK_SIZE: int = 1024 * 1024
+    # число потоков для параллельного скачивания частей из S3
+    TRANSFER_MAX_WORKERS: int = 8
+    # ограничения трафика всех скачиваний и загрузок процесса, None - без ограничений
+    TRANSFER_MAX_BYTES_PER_SECOND: int | None = None
+    TRANSFER_MAX_CONCURRENT: int | None = None
+    # доля полосы, доступная фоновым (prefetch) передачам
+    TRANSFER_BACKGROUND_SHARE: float = 0.3
+    # общая директория для согласования ограничений между процессами хоста
+    TRANSFER_GOVERNOR_DIR: str | None = None
+
+    # согласование сжатия zstd с сервисом (Accept-Encoding)
+    COMPRESSION_ENABLED: bool = True
+    # хранить сконвертированные веса в S3 сжатыми под ключом с суффиксом .zst,
+    # такие объекты не видны версиям vlmsw без поддержки сжатия
+    COMPRESSION_AT_REST: bool = False
+    COMPRESSION_LEVEL: int = 3
+    # 0 - в текущем потоке, -1 - по числу ядер
+    COMPRESSION_THREADS: int = 0
+    # маленькие и уже сжатые файлы (высокая энтропия) хранятся как есть
+    COMPRESSION_MIN_SIZE: int = 64 * 1024
+    COMPRESSION_ENTROPY_THRESHOLD: float = 7.5
+
+    # сокет локального кеширующего демона, None - всегда скачивать напрямую
+    CACHE_DAEMON_SOCKET: str | None = None
+    CACHE_DAEMON_STORE: str = "/var/cache/vlmsw"
+    CACHE_DAEMON_TIMEOUT: float = 600.0
+    # права и группа сокета демона: подключаться могут только владелец и участники группы
+    CACHE_DAEMON_SOCKET_MODE: int = 0o660
+    CACHE_DAEMON_SOCKET_GROUP: str | None = None
 
     class ConfigDict:
         """